@@ -0,0 +1,25 @@
+"""Index forecasts by user, city and date
+
+Revision ID: 4e1f8b6a2c07
+Revises: 7a9d3c2e1b58
+Create Date: 2024-10-30 14:36:08.913402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '4e1f8b6a2c07'
+down_revision = '7a9d3c2e1b58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_weatherforecast_user_id_city_code_date', 'weatherforecast', ['user_id', 'city_code', 'date'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_weatherforecast_user_id_city_code_date', table_name='weatherforecast')
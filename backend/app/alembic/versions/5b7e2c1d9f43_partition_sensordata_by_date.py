@@ -0,0 +1,90 @@
+"""Partition sensordata by date
+
+Revision ID: 5b7e2c1d9f43
+Revises: af1669152cd9
+Create Date: 2024-10-28 10:12:45.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7e2c1d9f43'
+down_revision = 'af1669152cd9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.rename_table('sensordata', 'sensordata_old')
+    op.execute('ALTER TABLE sensordata_old RENAME CONSTRAINT sensordata_pkey TO sensordata_old_pkey')
+    op.create_table('sensordata',
+    sa.Column('identifier', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('sensor', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('city', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('category', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('measurement', sa.Float(), nullable=False),
+    sa.Column('unit', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.Column('date', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id', 'date'),
+    postgresql_partition_by='RANGE (date)'
+    )
+    op.create_index('ix_sensordata_city_category_date', 'sensordata', ['city', 'category', 'date'], unique=False)
+    # Catches readings outside of the managed monthly partitions
+    op.execute('CREATE TABLE sensordata_default PARTITION OF sensordata DEFAULT')
+    # Monthly partitions for the existing readings up to the next month,
+    # later ones are created by app.sensors.partitions
+    op.execute("""
+        DO $$
+        DECLARE
+            month timestamp;
+        BEGIN
+            FOR month IN
+                SELECT generate_series(
+                    date_trunc('month', least(bounds.first, now()::timestamp)),
+                    date_trunc('month', now()::timestamp) + interval '1 month',
+                    interval '1 month'
+                )
+                FROM (SELECT min(date) AS first FROM sensordata_old) AS bounds
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF sensordata FOR VALUES FROM (%L) TO (%L)',
+                    'sensordata_p' || to_char(month, 'YYYYMM'),
+                    month,
+                    month + interval '1 month'
+                );
+            END LOOP;
+        END $$
+    """)
+    op.execute("""
+        INSERT INTO sensordata (identifier, sensor, city, category, measurement, unit, id, date)
+        SELECT identifier, sensor, city, category, measurement, unit, id, date
+        FROM sensordata_old
+    """)
+    op.drop_table('sensordata_old')
+
+
+def downgrade():
+    op.rename_table('sensordata', 'sensordata_partitioned')
+    op.create_table('sensordata',
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.Column('identifier', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('sensor', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('city', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('category', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('measurement', sa.Float(), nullable=False),
+    sa.Column('unit', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('date', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id', name='sensordata_pkey_new')
+    )
+    op.execute("""
+        INSERT INTO sensordata (id, identifier, sensor, city, category, measurement, unit, date)
+        SELECT id, identifier, sensor, city, category, measurement, unit, date
+        FROM sensordata_partitioned
+    """)
+    # Dropping the parent drops all of its partitions
+    op.drop_table('sensordata_partitioned')
+    op.execute('ALTER TABLE sensordata RENAME CONSTRAINT sensordata_pkey_new TO sensordata_pkey')
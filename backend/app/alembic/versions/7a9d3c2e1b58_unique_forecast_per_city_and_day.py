@@ -0,0 +1,39 @@
+"""Unique forecast per city and day
+
+Revision ID: 7a9d3c2e1b58
+Revises: c3a81f0e6d27
+Create Date: 2024-10-30 10:12:44.281935
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '7a9d3c2e1b58'
+down_revision = 'c3a81f0e6d27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keep a single forecast per city and day before enforcing it
+    op.execute("""
+        DELETE FROM weatherforecast
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, row_number() OVER (
+                    PARTITION BY city_code, CAST(date AS DATE)
+                    ORDER BY date DESC, id
+                ) AS position
+                FROM weatherforecast
+            ) AS ranked
+            WHERE position > 1
+        )
+    """)
+    op.create_index('uq_weatherforecast_city_code_day', 'weatherforecast', ['city_code', sa.text('CAST(date AS DATE)')], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_weatherforecast_city_code_day', table_name='weatherforecast')
@@ -0,0 +1,231 @@
+"""Normalize sensordata into sensors and readings
+
+Revision ID: 8f3c1d7e2a46
+Revises: 4e1f8b6a2c07
+Create Date: 2024-11-01 09:48:17.604392
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '8f3c1d7e2a46'
+down_revision = '4e1f8b6a2c07'
+branch_labels = None
+depends_on = None
+
+
+def move_partitions(old_parent):
+    # Renames the partitions of the old parent out of the way and creates the
+    # same ones, with their names and bounds, for the new sensordata table
+    op.execute(f"""
+        DO $$
+        DECLARE
+            partition record;
+        BEGIN
+            FOR partition IN
+                SELECT
+                    child.relname AS name,
+                    pg_get_expr(child.relpartbound, child.oid) AS bound,
+                    pkey.conname AS pkey
+                FROM pg_inherits
+                JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+                JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+                JOIN pg_constraint pkey ON pkey.conrelid = child.oid AND pkey.contype = 'p'
+                WHERE parent.relname = '{old_parent}'
+            LOOP
+                -- Inherited constraints can't be renamed, their index can
+                EXECUTE format(
+                    'ALTER INDEX %I RENAME TO %I',
+                    partition.pkey,
+                    '{old_parent}' || substr(partition.pkey, length('sensordata') + 1)
+                );
+                EXECUTE format(
+                    'ALTER TABLE %I RENAME TO %I',
+                    partition.name,
+                    '{old_parent}' || substr(partition.name, length('sensordata') + 1)
+                );
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF sensordata %s',
+                    partition.name,
+                    partition.bound
+                );
+            END LOOP;
+        END $$
+    """)
+
+
+def upgrade():
+    op.create_table('sensor',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('identifier', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('sensor', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('category', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('unit', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('city_code', sa.Uuid(), nullable=False),
+    sa.ForeignKeyConstraint(['city_code'], ['meteorologicalstation.code'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('uq_sensor_city_code_identifier_sensor_category_unit', 'sensor', ['city_code', 'identifier', 'sensor', 'category', 'unit'], unique=True)
+    # Station of each city of the existing readings and rollups, by code or
+    # else by name when a single station has it
+    op.execute("""
+        CREATE TABLE sensordata_city AS
+        SELECT cities.city, coalesce(by_code.code, by_name.code) AS city_code
+        FROM (SELECT city FROM sensordata UNION SELECT city FROM sensordatarollup) AS cities
+        LEFT JOIN meteorologicalstation AS by_code
+            ON by_code.code::text = lower(cities.city)
+        LEFT JOIN (
+            SELECT lower(name) AS name, min(code::text)::uuid AS code
+            FROM meteorologicalstation
+            GROUP BY lower(name)
+            HAVING count(*) = 1
+        ) AS by_name ON by_name.name = lower(cities.city)
+    """)
+    op.execute("""
+        INSERT INTO sensor (identifier, sensor, category, unit, city_code)
+        SELECT DISTINCT sensordata.identifier, sensordata.sensor, sensordata.category, sensordata.unit, sensordata_city.city_code
+        FROM sensordata
+        JOIN sensordata_city ON sensordata_city.city = sensordata.city
+        WHERE sensordata_city.city_code IS NOT NULL
+    """)
+    # Readings of cities matching no station are kept aside, they can be moved
+    # back once their station exists
+    op.create_table('sensordata_unlinked',
+    sa.Column('identifier', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('sensor', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('city', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('category', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('measurement', sa.Float(), nullable=False),
+    sa.Column('unit', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('date', sa.DateTime(), nullable=False)
+    )
+    op.execute("""
+        INSERT INTO sensordata_unlinked (identifier, sensor, city, category, measurement, unit, date)
+        SELECT sensordata.identifier, sensordata.sensor, sensordata.city, sensordata.category,
+            sensordata.measurement, sensordata.unit, sensordata.date
+        FROM sensordata
+        JOIN sensordata_city ON sensordata_city.city = sensordata.city
+        WHERE sensordata_city.city_code IS NULL
+    """)
+
+    op.rename_table('sensordata', 'sensordata_old')
+    op.execute('ALTER TABLE sensordata_old RENAME CONSTRAINT sensordata_pkey TO sensordata_old_pkey')
+    op.create_table('sensordata',
+    sa.Column('sensor_id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.DateTime(), nullable=False),
+    sa.Column('measurement', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['sensor_id'], ['sensor.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('sensor_id', 'date'),
+    postgresql_partition_by='RANGE (date)'
+    )
+    move_partitions('sensordata_old')
+    # A sensor keeps a single reading per date
+    op.execute("""
+        INSERT INTO sensordata (sensor_id, date, measurement)
+        SELECT sensor.id, reading.date, reading.measurement
+        FROM sensordata_old AS reading
+        JOIN sensordata_city ON sensordata_city.city = reading.city
+        JOIN sensor
+            ON sensor.city_code = sensordata_city.city_code
+            AND sensor.identifier = reading.identifier
+            AND sensor.sensor = reading.sensor
+            AND sensor.category = reading.category
+            AND sensor.unit = reading.unit
+        ON CONFLICT DO NOTHING
+    """)
+    # Dropping the parent drops all of its partitions
+    op.drop_table('sensordata_old')
+
+    # Rollups are keyed by station code like new ones, merging the rollups of
+    # the cities of a same station, the ones of unknown cities are kept aside
+    op.create_table('sensordatarollup_unlinked',
+    sa.Column('resolution', sqlmodel.sql.sqltypes.AutoString(length=8), nullable=False),
+    sa.Column('city', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('category', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('bucket', sa.DateTime(), nullable=False),
+    sa.Column('unit', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('min', sa.Float(), nullable=False),
+    sa.Column('max', sa.Float(), nullable=False),
+    sa.Column('sum', sa.Float(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('resolution', 'city', 'category', 'bucket')
+    )
+    op.execute("""
+        INSERT INTO sensordatarollup_unlinked
+        SELECT rollup.resolution, rollup.city, rollup.category, rollup.bucket, rollup.unit,
+            rollup.min, rollup.max, rollup.sum, rollup.count
+        FROM sensordatarollup AS rollup
+        JOIN sensordata_city ON sensordata_city.city = rollup.city
+        WHERE sensordata_city.city_code IS NULL
+    """)
+    op.execute("""
+        INSERT INTO sensordatarollup (resolution, city, category, bucket, unit, min, max, sum, count)
+        SELECT rollup.resolution, sensordata_city.city_code::text, rollup.category, rollup.bucket,
+            max(rollup.unit), min(rollup.min), max(rollup.max), sum(rollup.sum), sum(rollup.count)
+        FROM sensordatarollup AS rollup
+        JOIN sensordata_city ON sensordata_city.city = rollup.city
+        WHERE sensordata_city.city_code IS NOT NULL
+            AND rollup.city <> sensordata_city.city_code::text
+        GROUP BY rollup.resolution, sensordata_city.city_code, rollup.category, rollup.bucket
+        ON CONFLICT (resolution, city, category, bucket) DO UPDATE SET
+            unit = excluded.unit,
+            min = least(sensordatarollup.min, excluded.min),
+            max = greatest(sensordatarollup.max, excluded.max),
+            sum = sensordatarollup.sum + excluded.sum,
+            count = sensordatarollup.count + excluded.count
+    """)
+    op.execute("""
+        DELETE FROM sensordatarollup AS rollup
+        USING sensordata_city
+        WHERE sensordata_city.city = rollup.city
+            AND (sensordata_city.city_code IS NULL OR rollup.city <> sensordata_city.city_code::text)
+    """)
+    op.drop_table('sensordata_city')
+
+
+def downgrade():
+    # Rollups stay keyed by station code, the city of the readings downgraded below
+    op.execute("""
+        INSERT INTO sensordatarollup
+        SELECT * FROM sensordatarollup_unlinked
+        ON CONFLICT DO NOTHING
+    """)
+    op.drop_table('sensordatarollup_unlinked')
+    op.rename_table('sensordata', 'sensordata_sensor')
+    op.execute('ALTER TABLE sensordata_sensor RENAME CONSTRAINT sensordata_pkey TO sensordata_sensor_pkey')
+    op.create_table('sensordata',
+    sa.Column('identifier', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('sensor', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('city', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('category', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('measurement', sa.Float(), nullable=False),
+    sa.Column('unit', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.Column('date', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id', 'date'),
+    postgresql_partition_by='RANGE (date)'
+    )
+    op.create_index('ix_sensordata_city_category_date', 'sensordata', ['city', 'category', 'date'], unique=False)
+    move_partitions('sensordata_sensor')
+    # Random ids without pgcrypto, gen_random_uuid is built in from PostgreSQL 13
+    op.execute("""
+        INSERT INTO sensordata (identifier, sensor, city, category, measurement, unit, id, date)
+        SELECT sensor.identifier, sensor.sensor, sensor.city_code::text, sensor.category,
+            reading.measurement, sensor.unit,
+            md5(random()::text || clock_timestamp()::text)::uuid, reading.date
+        FROM sensordata_sensor AS reading
+        JOIN sensor ON sensor.id = reading.sensor_id
+    """)
+    op.execute("""
+        INSERT INTO sensordata (identifier, sensor, city, category, measurement, unit, id, date)
+        SELECT identifier, sensor, city, category, measurement, unit,
+            md5(random()::text || clock_timestamp()::text)::uuid, date
+        FROM sensordata_unlinked
+    """)
+    op.drop_table('sensordata_unlinked')
+    op.drop_table('sensordata_sensor')
+    op.drop_index('uq_sensor_city_code_identifier_sensor_category_unit', table_name='sensor')
+    op.drop_table('sensor')
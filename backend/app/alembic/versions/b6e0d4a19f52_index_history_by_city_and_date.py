@@ -0,0 +1,25 @@
+"""Index history by city and date
+
+Revision ID: b6e0d4a19f52
+Revises: 8f3c1d7e2a46
+Create Date: 2024-11-02 11:05:39.274816
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6e0d4a19f52'
+down_revision = '8f3c1d7e2a46'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_weatherhistory_city_code_date_id', 'weatherhistory', ['city_code', 'date', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_weatherhistory_city_code_date_id', table_name='weatherhistory')
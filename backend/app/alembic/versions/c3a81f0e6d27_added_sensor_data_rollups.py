@@ -0,0 +1,45 @@
+"""Added sensor data rollups
+
+Revision ID: c3a81f0e6d27
+Revises: 5b7e2c1d9f43
+Create Date: 2024-10-29 09:41:03.527916
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3a81f0e6d27'
+down_revision = '5b7e2c1d9f43'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sensordatarollup',
+    sa.Column('resolution', sqlmodel.sql.sqltypes.AutoString(length=8), nullable=False),
+    sa.Column('city', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('category', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('bucket', sa.DateTime(), nullable=False),
+    sa.Column('unit', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('min', sa.Float(), nullable=False),
+    sa.Column('max', sa.Float(), nullable=False),
+    sa.Column('sum', sa.Float(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('resolution', 'city', 'category', 'bucket')
+    )
+    # Backfill the rollups from the readings already stored
+    for resolution, field in (('1m', 'minute'), ('1h', 'hour'), ('1d', 'day')):
+        op.execute(f"""
+            INSERT INTO sensordatarollup (resolution, city, category, bucket, unit, min, max, sum, count)
+            SELECT '{resolution}', city, category, date_trunc('{field}', date), max(unit),
+                min(measurement), max(measurement), sum(measurement), count(*)
+            FROM sensordata
+            GROUP BY city, category, date_trunc('{field}', date)
+        """)
+
+
+def downgrade():
+    op.drop_table('sensordatarollup')
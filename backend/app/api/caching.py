@@ -0,0 +1,69 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any
+
+from fastapi import Request, Response
+
+
+def make_etag(*parts: Any) -> str:
+    """
+    Strong ETag from cheap validators (e.g. max(date), a count or a version).
+    """
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+    Whether the If-None-Match header of the request matches the current ETag.
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in {tag.strip().removeprefix("W/") for tag in header.split(",")}
+
+
+def not_modified_since(request: Request, last_modified: datetime) -> bool:
+    header = request.headers.get("if-modified-since")
+    if not header:
+        return False
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return last_modified.replace(microsecond=0) <= since
+
+
+def conditional_get(
+    request: Request,
+    response: Response,
+    *,
+    etag: str,
+    cache_control: str,
+    last_modified: datetime | None = None,
+) -> Response | None:
+    """
+    Set the validators and Cache-Control on the response.
+
+    Returns a 304 Not Modified response when the client's copy is still fresh,
+    so the route can return it before loading and serializing the payload.
+    """
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified is not None:
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    response.headers.update(headers)
+
+    if "if-none-match" in request.headers:
+        fresh = etag_matches(request, etag)
+    else:
+        fresh = last_modified is not None and not_modified_since(request, last_modified)
+    if fresh:
+        return Response(status_code=304, headers=headers)
+    return None
@@ -1,17 +1,18 @@
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Generator
 from typing import Annotated
 
-import jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
 from pydantic import ValidationError
+from sqlalchemy.exc import OperationalError
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.core import security
+from app.auth import auth_cache
 from app.core.config import settings
-from app.core.db import engine
-from app.models import TokenPayload, User
+from app.core.db import async_engine, engine, replica_router
+from app.models import User
 
 reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/login/access-token"
@@ -23,22 +24,66 @@ def get_db() -> Generator[Session, None, None]:
         yield session
 
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    # Attributes stay loaded after commit, lazy loads can't run outside of await
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
+
+def get_read_db() -> Generator[Session, None, None]:
+    """
+    Session on a read replica for read-only routes, or on the primary if none
+    of them can be reached.
+    """
+    for replica in replica_router.candidates(use_async=False):
+        try:
+            connection = replica.engine.connect()
+        except OperationalError:
+            replica_router.mark_down(replica)
+            continue
+        with connection, Session(bind=connection) as session:
+            yield session
+        return
+    yield from get_db()
+
+
+async def get_async_read_db() -> AsyncGenerator[AsyncSession, None]:
+    for replica in replica_router.candidates(use_async=True):
+        try:
+            connection = await replica.async_engine.connect()
+        except OperationalError:
+            replica_router.mark_down(replica)
+            continue
+        async with (
+            connection,
+            AsyncSession(bind=connection, expire_on_commit=False) as session,
+        ):
+            yield session
+        return
+    async for session in get_async_db():
+        yield session
+
+
 SessionDep = Annotated[Session, Depends(get_db)]
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_db)]
+# Replicas lag a little behind the primary, only for routes that don't write
+ReadSessionDep = Annotated[Session, Depends(get_read_db)]
+AsyncReadSessionDep = Annotated[AsyncSession, Depends(get_async_read_db)]
 TokenDep = Annotated[str, Depends(reusable_oauth2)]
 
 
-def get_current_user(session: SessionDep, token: TokenDep) -> User:
+def _token_user_id(token: str) -> str | None:
     try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
-        )
-        token_data = TokenPayload(**payload)
+        token_data = auth_cache.decode_token(token)
     except (InvalidTokenError, ValidationError):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    user = session.get(User, token_data.sub)
+    return token_data.sub
+
+
+def _check_user(user: User | None) -> User:
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if not user.is_active:
@@ -46,7 +91,22 @@ def get_current_user(session: SessionDep, token: TokenDep) -> User:
     return user
 
 
+def get_current_user(session: SessionDep, token: TokenDep) -> User:
+    user_id = _token_user_id(token)
+    return _check_user(auth_cache.get_user(session, user_id) if user_id else None)
+
+
+async def get_current_user_async(session: AsyncSessionDep, token: TokenDep) -> User:
+    """
+    Current user for routes on the event loop, looked up without blocking it.
+    """
+    user_id = _token_user_id(token)
+    user = await auth_cache.get_user_async(session, user_id) if user_id else None
+    return _check_user(user)
+
+
 CurrentUser = Annotated[User, Depends(get_current_user)]
+AsyncCurrentUser = Annotated[User, Depends(get_current_user_async)]
 
 
 def get_current_active_superuser(current_user: CurrentUser) -> User:
@@ -4,6 +4,7 @@ from app.api.routes import (
     forecast,
     history,
     login,
+    sensors,
     stations,
     users,
     utils,
@@ -17,4 +18,5 @@ api_router.include_router(utils.router, prefix="/utils", tags=["utils"])
 api_router.include_router(forecast.router, prefix="/forecast", tags=["forecast"])
 api_router.include_router(stations.router, prefix="/stations", tags=["stations"])
 api_router.include_router(history.router, prefix="/history", tags=["history"])
+api_router.include_router(sensors.router, prefix="/sensors", tags=["sensors"])
 api_router.include_router(websockets.router, prefix="/ws", tags=["ws"])
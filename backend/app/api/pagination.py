@@ -0,0 +1,82 @@
+import base64
+import json
+from collections.abc import Callable
+from typing import Any, Literal, cast
+
+from fastapi import HTTPException
+from sqlmodel import Session, func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlmodel.sql.expression import SelectOfScalar
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+# How list endpoints compute the total count of rows
+CountMode = Literal["exact", "estimated", "none"]
+
+count_cache: TTLCache[tuple[Any, ...], int] = TTLCache(
+    max_size=1024, ttl=settings.COUNT_CACHE_TTL_SECONDS
+)
+
+
+def encode_cursor(*values: Any) -> str:
+    """
+    Opaque keyset pagination cursor holding the sort key of the last row of a page.
+    """
+    data = json.dumps([str(value) for value in values]).encode()
+    return base64.urlsafe_b64encode(data).decode()
+
+
+def decode_cursor(cursor: str, *parsers: Callable[[str], Any]) -> tuple[Any, ...]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list):
+            raise ValueError(cursor)
+        # strict zip raises ValueError when the number of values doesn't match
+        return tuple(parse(value) for parse, value in zip(parsers, values, strict=True))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def estimate_count(session: Session, statement: SelectOfScalar[Any]) -> int:
+    """
+    Row count estimated by the query planner from table statistics.
+    """
+    compiled = statement.compile(dialect=session.get_bind().dialect)
+    plan = (
+        session.connection()
+        .exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params)
+        .scalar_one()
+    )
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def count_rows(
+    session: Session, statement: SelectOfScalar[Any], mode: CountMode
+) -> int | None:
+    """
+    Count the rows of a filtered listing statement, without ordering or paging.
+
+    Exact counts are cached per statement and parameters for a short time.
+    """
+    if mode == "none":
+        return None
+    if mode == "estimated":
+        return estimate_count(session, statement)
+    compiled = statement.compile()
+    key = (str(compiled), tuple(sorted(compiled.params.items())))
+    count = count_cache.get(key)
+    if count is None:
+        count_statement = select(func.count()).select_from(statement.subquery())
+        count = session.exec(count_statement).one()
+        count_cache.set(key, count)
+    return count
+
+
+async def count_rows_async(
+    session: AsyncSession, statement: SelectOfScalar[Any], mode: CountMode
+) -> int | None:
+    # The sync session of a sqlmodel AsyncSession is a sqlmodel Session
+    return await session.run_sync(
+        lambda sync_session: count_rows(cast(Session, sync_session), statement, mode)
+    )
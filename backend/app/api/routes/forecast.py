@@ -1,72 +1,144 @@
 import uuid
-from typing import Any
+from datetime import date, datetime, timezone
+from typing import Any, cast
 
-from fastapi import APIRouter, HTTPException
-from sqlmodel import func, select
+from fastapi import APIRouter, HTTPException, Request, Response
+from sqlalchemy import literal_column, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from sqlmodel import Session, col, select
 
-from app.api.deps import CurrentUser, SessionDep
+from app import crud
+from app.api.caching import conditional_get, make_etag
+from app.api.deps import AsyncCurrentUser, AsyncReadSessionDep, AsyncSessionDep
+from app.api.pagination import (
+    CountMode,
+    count_rows_async,
+    decode_cursor,
+    encode_cursor,
+)
 from app.models import (
     Message,
-    MeteorologicalStation,
     WeatherForecast,
+    WeatherForecastBulkOutcome,
+    WeatherForecastBulkResult,
     WeatherForecastCreate,
     WeatherForecastPublic,
     WeatherForecastsPublic,
 )
+from app.stations import station_catalogue
 
 router = APIRouter()
 
+# Rows accepted by a single bulk upsert request
+bulk_max_rows = 10_000
+
+# Load the embedded city and user in the same query instead of once per row, the
+# async session can't lazy load them while the response is serialized
+forecast_eager_options = [
+    joinedload(WeatherForecast.city),  # type: ignore[arg-type]
+    joinedload(WeatherForecast.user),  # type: ignore[arg-type]
+]
+
+
+def _naive_utc(date: datetime) -> datetime:
+    if date.tzinfo is not None:
+        date = date.astimezone(timezone.utc).replace(tzinfo=None)
+    return date
+
+
+def is_duplicate_forecast(error: IntegrityError) -> bool:
+    """
+    Whether a write failed on the unique forecast per city and day.
+    """
+    diag = getattr(error.orig, "diag", None)
+    return diag is not None and (
+        diag.constraint_name == "uq_weatherforecast_city_code_day"
+    )
+
 
 @router.get("/", response_model=WeatherForecastsPublic)
-def get_weather_forecast(
-    session: SessionDep,
-    current_user: CurrentUser,
+async def get_weather_forecast(
+    session: AsyncReadSessionDep,
+    current_user: AsyncCurrentUser,
+    request: Request,
+    response: Response,
     city_code: uuid.UUID | None = None,
     skip: int = 0,
     limit: int = 7,
+    cursor: str | None = None,
+    count: CountMode = "exact",
 ) -> Any:
     """
     Get weather forecast for next days in specific city.
+
+    Pass the next_cursor of a page as cursor to get the next one, skip is then
+    ignored. The total count is exact (cached for a few seconds), estimated
+    by the planner or not computed (null) depending on count.
     """
 
     if city_code is None:
         return WeatherForecastsPublic(data=[], count=0)
 
     if current_user.is_superuser:
-        count_statement = select(func.count()).select_from(WeatherForecast)
-        count = session.exec(count_statement).one()
-        statement = select(WeatherForecast).offset(skip).limit(limit)
-        forecasts = session.exec(statement).all()
+        statement = select(WeatherForecast)
     else:
-        count_statement = (
-            select(func.count())
-            .select_from(WeatherForecast)
-            .where(
-                WeatherForecast.user_id == current_user.id,
-                WeatherForecast.city_code == city_code,
-            )
+        statement = select(WeatherForecast).where(
+            WeatherForecast.user_id == current_user.id,
+            WeatherForecast.city_code == city_code,
         )
-        count = session.exec(count_statement).one()
-        statement = (
-            select(WeatherForecast)
-            .where(
-                WeatherForecast.user_id == current_user.id,
-                WeatherForecast.city_code == city_code,
-            )
-            .offset(skip)
-            .limit(limit)
+
+    total = await count_rows_async(session, statement, count)
+
+    page_statement = (
+        statement.options(*forecast_eager_options)
+        # Row version, any update creates one with a newer transaction id
+        .add_columns(literal_column("weatherforecast.xmin::text::bigint"))
+        .order_by(col(WeatherForecast.date), col(WeatherForecast.id))
+        .limit(limit)
+    )
+    if cursor is not None:
+        last_date, last_id = decode_cursor(cursor, datetime.fromisoformat, uuid.UUID)
+        page_statement = page_statement.where(
+            tuple_(col(WeatherForecast.date), col(WeatherForecast.id))
+            > (last_date, last_id)
         )
-        forecasts = session.exec(statement).all()
+    else:
+        page_statement = page_statement.offset(skip)
+    rows = (await session.execute(page_statement)).all()
+    forecasts: list[WeatherForecast] = [row[0] for row in rows]
+
+    # The page and the total make up the whole response, the versions of its
+    # rows validate cached copies without querying more than the page
+    not_modified = conditional_get(
+        request,
+        response,
+        etag=make_etag(
+            request.url.query,
+            current_user.id,
+            total,
+            [(row[0].id, row[1]) for row in rows],
+        ),
+        cache_control="private, no-cache",
+    )
+    if not_modified:
+        return not_modified
 
-    return WeatherForecastsPublic(data=forecasts, count=count)
+    next_cursor = None
+    if len(forecasts) == limit:
+        next_cursor = encode_cursor(forecasts[-1].date, forecasts[-1].id)
+
+    return WeatherForecastsPublic(data=forecasts, count=total, next_cursor=next_cursor)
 
 
 @router.get("/{id}", response_model=WeatherForecastPublic)
-def read_forecast(session: SessionDep, current_user: CurrentUser, id: uuid.UUID) -> Any:
+async def read_forecast(
+    session: AsyncReadSessionDep, current_user: AsyncCurrentUser, id: uuid.UUID
+) -> Any:
     """
     Get daily weather forecast by ID.
     """
-    forecast = session.get(WeatherForecast, id)
+    forecast = await session.get(WeatherForecast, id, options=forecast_eager_options)
     if not forecast:
         raise HTTPException(status_code=404, detail="Weather forecast not found")
     if not current_user.is_superuser and (forecast.user_id != current_user.id):
@@ -75,71 +147,143 @@ def read_forecast(session: SessionDep, current_user: CurrentUser, id: uuid.UUID)
 
 
 @router.post("/", response_model=WeatherForecastPublic)
-def create_forecast(
+async def create_forecast(
     *,
-    session: SessionDep,
-    current_user: CurrentUser,
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser,
     forecast_in: WeatherForecastCreate,
 ) -> Any:
     """
     Create new forecast for a day in specific city.
     """
-    city_exists = session.exec(
-        select(MeteorologicalStation).where(
-            MeteorologicalStation.code == forecast_in.city_code
-        )
-    ).first()
+    city_exists = await station_catalogue.get_station(session, forecast_in.city_code)
 
     if not city_exists:
         raise HTTPException(
             status_code=400, detail="City code not found in Meteorological Station"
         )
 
-    forecast_exists = session.exec(
-        select(WeatherForecast).where(
-            WeatherForecast.city_code == forecast_in.city_code,
-            func.date(WeatherForecast.date) == forecast_in.date.date(),
-        )
-    ).first()
-
-    if forecast_exists:
+    forecast = WeatherForecast.model_validate(
+        forecast_in, update={"user_id": current_user.id}
+    )
+    session.add(forecast)
+    try:
+        await session.commit()
+    except IntegrityError as e:
+        await session.rollback()
+        if not is_duplicate_forecast(e):
+            raise
         raise HTTPException(
             status_code=400,
             detail="Forecast for this city and day already exists. Instead of creating one, you can update it.",
         )
+    await session.refresh(forecast, ["city", "user"])
+    return forecast
 
-    forecast = WeatherForecast.model_validate(
-        forecast_in, update={"user_id": current_user.id}
+
+@router.post("/bulk", response_model=WeatherForecastBulkResult)
+async def upsert_forecasts(
+    *,
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser,
+    forecasts_in: list[WeatherForecastCreate],
+) -> Any:
+    """
+    Create or update forecasts for many cities and days in one transaction.
+
+    Rows are matched to existing forecasts by city and day. Forecasts of other
+    users are only overwritten by superusers. Rows for unknown stations or
+    followed by another row for the same city and day are rejected.
+    """
+    if len(forecasts_in) > bulk_max_rows:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {bulk_max_rows} forecasts can be sent at once",
+        )
+
+    # Dates are stored in naive UTC, rows are matched by their day in UTC too
+    dates = [_naive_utc(forecast_in.date) for forecast_in in forecasts_in]
+    # The last row of a city and day wins
+    latest: dict[tuple[uuid.UUID, date], int] = {}
+    for index, forecast_in in enumerate(forecasts_in):
+        latest[(forecast_in.city_code, dates[index].date())] = index
+    known_cities = {
+        code
+        for code in {forecast_in.city_code for forecast_in in forecasts_in}
+        if await station_catalogue.get_station(session, code)
+    }
+
+    outcomes: dict[int, WeatherForecastBulkOutcome] = {}
+    accepted: list[tuple[int, WeatherForecast]] = []
+    for index, forecast_in in enumerate(forecasts_in):
+        if latest[(forecast_in.city_code, dates[index].date())] != index:
+            outcomes[index] = WeatherForecastBulkOutcome(
+                index=index,
+                status="rejected",
+                detail="Superseded by a later row for the same city and day",
+            )
+        elif forecast_in.city_code not in known_cities:
+            outcomes[index] = WeatherForecastBulkOutcome(
+                index=index,
+                status="rejected",
+                detail="City code not found in Meteorological Station",
+            )
+        else:
+            forecast = WeatherForecast.model_validate(
+                forecast_in, update={"user_id": current_user.id, "date": dates[index]}
+            )
+            accepted.append((index, forecast))
+
+    owner_id = None if current_user.is_superuser else current_user.id
+    written = await session.run_sync(
+        lambda sync_session: crud.upsert_forecasts(
+            session=cast(Session, sync_session),
+            forecasts=[forecast for _, forecast in accepted],
+            user_id=owner_id,
+        )
+    )
+    await session.commit()
+
+    for index, forecast in accepted:
+        result = written.get((forecast.city_code, forecast.date.date()))
+        if result is None:
+            outcomes[index] = WeatherForecastBulkOutcome(
+                index=index, status="rejected", detail="Not enough permissions"
+            )
+        else:
+            id, created = result
+            outcomes[index] = WeatherForecastBulkOutcome(
+                index=index, status="created" if created else "updated", id=id
+            )
+
+    data = [outcomes[index] for index in range(len(forecasts_in))]
+    return WeatherForecastBulkResult(
+        created=sum(outcome.status == "created" for outcome in data),
+        updated=sum(outcome.status == "updated" for outcome in data),
+        rejected=sum(outcome.status == "rejected" for outcome in data),
+        data=data,
     )
-    session.add(forecast)
-    session.commit()
-    session.refresh(forecast)
-    return forecast
 
 
 @router.put("/{id}", response_model=WeatherForecastPublic)
-def update_forecast(
+async def update_forecast(
     *,
-    session: SessionDep,
-    current_user: CurrentUser,
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser,
     id: uuid.UUID,
     forecast_in: WeatherForecastCreate,
 ) -> Any:
     """
     Update a forecast for a day in specific city.
     """
-    city_exists = session.exec(
-        select(MeteorologicalStation).where(
-            MeteorologicalStation.code == forecast_in.city_code
-        )
-    ).first()
+    city_exists = await station_catalogue.get_station(session, forecast_in.city_code)
 
     if not city_exists:
         raise HTTPException(
             status_code=400, detail="City code not found in Meteorological Station"
         )
 
-    forecast = session.get(WeatherForecast, id)
+    forecast = await session.get(WeatherForecast, id)
     if not forecast:
         raise HTTPException(
             status_code=404,
@@ -150,23 +294,32 @@ def update_forecast(
     update_dict = forecast_in.model_dump(exclude_unset=True)
     forecast.sqlmodel_update(update_dict)
     session.add(forecast)
-    session.commit()
-    session.refresh(forecast)
+    try:
+        await session.commit()
+    except IntegrityError as e:
+        await session.rollback()
+        if not is_duplicate_forecast(e):
+            raise
+        raise HTTPException(
+            status_code=400,
+            detail="Another forecast for this city and day already exists.",
+        )
+    await session.refresh(forecast, ["city", "user"])
     return forecast
 
 
 @router.delete("/{id}")
-def delete_forecast(
-    session: SessionDep, current_user: CurrentUser, id: uuid.UUID
+async def delete_forecast(
+    session: AsyncSessionDep, current_user: AsyncCurrentUser, id: uuid.UUID
 ) -> Message:
     """
     Delete a weather forecast for a day in city.
     """
-    forecast = session.get(WeatherForecast, id)
+    forecast = await session.get(WeatherForecast, id)
     if not forecast:
         raise HTTPException(status_code=404, detail="Forecast not found")
     if not current_user.is_superuser and (forecast.user_id != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
-    session.delete(forecast)
-    session.commit()
+    await session.delete(forecast)
+    await session.commit()
     return Message(message="Forecast deleted successfully")
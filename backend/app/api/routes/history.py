@@ -1,46 +1,96 @@
 import uuid
+from datetime import datetime
 from typing import Any
 
-from fastapi import APIRouter
-from sqlmodel import desc, func, select
+from fastapi import APIRouter, Request, Response
+from sqlalchemy import tuple_
+from sqlalchemy.orm import joinedload
+from sqlmodel import col, desc, func, select
 
-from app.api.deps import SessionDep
+from app.api.caching import conditional_get, make_etag
+from app.api.deps import AsyncReadSessionDep
+from app.api.pagination import (
+    CountMode,
+    count_rows_async,
+    decode_cursor,
+    encode_cursor,
+)
+from app.core.config import settings
 from app.models import WeatherHistory, WeatherHistorysPublic
 
 router = APIRouter()
 
 
 @router.get("/", response_model=WeatherHistorysPublic)
-def get_weather_history(
-    session: SessionDep,
+async def get_weather_history(
+    session: AsyncReadSessionDep,
+    request: Request,
+    response: Response,
     city_code: uuid.UUID | None = None,
     skip: int = 0,
     limit: int = 10,
+    cursor: str | None = None,
+    count: CountMode = "exact",
 ) -> Any:
     """
     Get weather history for the given city_code or return empty if no match.
+
+    Pass the next_cursor of a page as cursor to get the next one, skip is then
+    ignored. The total count is exact (cached for a few seconds), estimated
+    by the planner or not computed (null) depending on count.
+
+    The newest date and the row count of the city validate cached copies, a
+    row backfilled before the newest date changes the count.
     """
 
     if city_code is None:
         return WeatherHistorysPublic(data=[], count=0)
 
-    count_statement = (
-        select(func.count())
-        .select_from(WeatherHistory)
-        .where(WeatherHistory.city_code == city_code)
+    last_date: datetime | None
+    last_date, rows = (
+        await session.exec(
+            select(func.max(WeatherHistory.date), func.count()).where(
+                WeatherHistory.city_code == city_code
+            )
+        )
+    ).one()
+    not_modified = conditional_get(
+        request,
+        response,
+        etag=make_etag(request.url.query, last_date, rows),
+        cache_control=f"public, max-age={settings.HTTP_CACHE_MAX_AGE_SECONDS}",
+        last_modified=last_date,
     )
-    count = session.exec(count_statement).one()
+    if not_modified:
+        return not_modified
 
-    if count == 0:
+    filtered = select(WeatherHistory).where(WeatherHistory.city_code == city_code)
+    total = await count_rows_async(session, filtered, count)
+
+    if total == 0:
         return WeatherHistorysPublic(data=[], count=0)
 
     statement = (
-        select(WeatherHistory)
-        .where(WeatherHistory.city_code == city_code)
-        .order_by(desc(WeatherHistory.date))  # Order by date descending
-        .offset(skip)
+        # Load the embedded city in the same query instead of once per row
+        filtered.options(joinedload(WeatherHistory.city))  # type: ignore[arg-type]
+        # Order by date descending, id breaks ties for the cursor
+        .order_by(desc(WeatherHistory.date), desc(WeatherHistory.id))
         .limit(limit)
     )
-    history = session.exec(statement).all()
+    if cursor is not None:
+        cursor_date, cursor_id = decode_cursor(
+            cursor, datetime.fromisoformat, uuid.UUID
+        )
+        statement = statement.where(
+            tuple_(col(WeatherHistory.date), col(WeatherHistory.id))
+            < (cursor_date, cursor_id)
+        )
+    else:
+        statement = statement.offset(skip)
+    history = (await session.exec(statement)).all()
+
+    next_cursor = None
+    if len(history) == limit:
+        next_cursor = encode_cursor(history[-1].date, history[-1].id)
 
-    return WeatherHistorysPublic(data=history, count=count)
+    return WeatherHistorysPublic(data=history, count=total, next_cursor=next_cursor)
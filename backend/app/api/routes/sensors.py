@@ -0,0 +1,265 @@
+import asyncio
+import csv
+import io
+import json
+import uuid
+from collections.abc import AsyncGenerator, Iterator
+from datetime import datetime
+from typing import Any, Literal
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import tuple_
+from sqlmodel import Session, col, desc, select
+from sqlmodel.sql.expression import Select
+
+from app.api.deps import SessionDep, get_current_active_superuser
+from app.api.pagination import decode_cursor, encode_cursor
+from app.core.config import settings
+from app.core.db import engine
+from app.models import (
+    Sensor,
+    SensorData,
+    SensorDataBulkLoadReport,
+    SensorDataPublic,
+    SensorDataRollup,
+    SensorDataRollupPublic,
+    SensorDataRollupsPublic,
+    SensorDatasPublic,
+    SensorReadingsPublic,
+)
+from app.sensors.bulk import BulkLoadFormat, SensorDataBulkLoader, aiter_chunks
+from app.sensors.latest import latest_readings
+from app.sensors.rollups import bucket_start, choose_resolution
+from app.websockets.manager import manager
+
+router = APIRouter()
+
+export_batch_size = 1000
+export_fields = list(SensorDataPublic.model_fields)
+# Comment sent on idle streams so proxies don't close them
+stream_keepalive_seconds = 15
+
+
+def export_sensor_data(
+    statement: Select[Any], format: Literal["ndjson", "csv"]
+) -> Iterator[str]:
+    """
+    Yield the rows as NDJSON or CSV lines, read in batches from a server-side cursor.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=export_fields)
+    if format == "csv":
+        writer.writeheader()
+    with Session(engine) as session:
+        rows = session.exec(statement.execution_options(yield_per=export_batch_size))
+        for row in rows:
+            data = SensorDataPublic.model_validate(row).model_dump(mode="json")
+            if format == "csv":
+                writer.writerow(data)
+            else:
+                buffer.write(json.dumps(data) + "\n")
+            if buffer.tell() >= 64 * 1024:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+    yield buffer.getvalue()
+
+
+async def stream_events(
+    city: str, last_event_id: int | None
+) -> AsyncGenerator[str, None]:
+    """
+    Yield the readings published for the city as server-sent events, starting
+    with the buffered ones newer than last_event_id if given (a reconnecting
+    client), else with the next published one.
+    """
+    # Subscribe before replaying, so nothing published in between is missed
+    subscription = manager.subscribe(city)
+    try:
+        newest_id = last_event_id or 0
+        if last_event_id is not None:
+            for event_id, message in manager.recent.since(city, last_event_id):
+                yield f"id: {event_id}\ndata: {json.dumps(message)}\n\n"
+                newest_id = event_id
+        while True:
+            try:
+                event_id, message = await asyncio.wait_for(
+                    subscription.get_event(), stream_keepalive_seconds
+                )
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if event_id <= newest_id:
+                continue
+            yield f"id: {event_id}\ndata: {json.dumps(message)}\n\n"
+    finally:
+        manager.unsubscribe(subscription)
+
+
+@router.get("/stream", response_class=StreamingResponse)
+async def stream_sensor_data(
+    city: uuid.UUID,
+    last_event_id: int | None = Header(default=None),
+) -> Any:
+    """
+    Live readings of a city (station code) as server-sent events, the same ones
+    sent to the WebSocket subscribers.
+
+    Reconnecting clients send the Last-Event-ID header and first receive the
+    recent readings they missed, new clients start with the next reading.
+    """
+    return StreamingResponse(
+        stream_events(str(city), last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/latest", response_model=SensorReadingsPublic)
+async def get_latest_sensor_data(
+    city: uuid.UUID,
+    category: str | None = None,
+    limit: int = Query(default=1, ge=1, le=settings.SENSOR_LATEST_READINGS),
+) -> Any:
+    """
+    Current conditions: the latest readings of each category of a city (station
+    code), served from memory without querying the database.
+
+    Only readings received since the API process started are known.
+    """
+    return SensorReadingsPublic(data=latest_readings.latest(str(city), limit, category))
+
+
+@router.get("/", response_model=SensorDatasPublic)
+def get_sensor_data(
+    session: SessionDep,
+    city: uuid.UUID | None = None,
+    sensor: str | None = None,
+    category: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    cursor: str | None = None,
+    limit: int = Query(default=100, ge=1, le=1000),
+    format: Literal["json", "ndjson", "csv"] = "json",
+) -> Any:
+    """
+    Get sensor readings, newest first, filtered by city (station code), sensor,
+    category and time range (start inclusive, end exclusive).
+
+    Pages are fetched with the next_cursor of the previous page. With format
+    ndjson or csv all matching readings are streamed instead.
+    """
+    statement = select(  # type: ignore[call-overload]
+        SensorData.sensor_id,
+        Sensor.identifier,
+        Sensor.sensor,
+        col(Sensor.city_code).label("city"),
+        Sensor.category,
+        SensorData.measurement,
+        Sensor.unit,
+        SensorData.date,
+    ).join(Sensor)
+    if city is not None:
+        statement = statement.where(Sensor.city_code == city)
+    if sensor is not None:
+        statement = statement.where(Sensor.sensor == sensor)
+    if category is not None:
+        statement = statement.where(Sensor.category == category)
+    if start is not None:
+        statement = statement.where(SensorData.date >= start)
+    if end is not None:
+        statement = statement.where(SensorData.date < end)
+    if cursor is not None:
+        last_date, last_sensor_id = decode_cursor(cursor, datetime.fromisoformat, int)
+        statement = statement.where(
+            tuple_(col(SensorData.date), col(SensorData.sensor_id))
+            < (last_date, last_sensor_id)
+        )
+    statement = statement.order_by(desc(SensorData.date), desc(SensorData.sensor_id))
+
+    if format != "json":
+        return StreamingResponse(
+            export_sensor_data(statement, format),
+            media_type="text/csv" if format == "csv" else "application/x-ndjson",
+        )
+
+    readings = [
+        SensorDataPublic.model_validate(row)
+        for row in session.exec(statement.limit(limit))
+    ]
+    next_cursor = None
+    if len(readings) == limit:
+        next_cursor = encode_cursor(readings[-1].date, readings[-1].sensor_id)
+
+    return SensorDatasPublic(data=readings, next_cursor=next_cursor)
+
+
+@router.post(
+    "/bulk",
+    dependencies=[Depends(get_current_active_superuser)],
+    response_model=SensorDataBulkLoadReport,
+)
+async def bulk_load_sensor_data(
+    request: Request,
+    format: BulkLoadFormat = "ndjson",
+    chunk_size: int = Query(default=5000, ge=1, le=100_000),
+) -> Any:
+    """
+    Bulk load sensor readings streamed as NDJSON or CSV in the request body.
+
+    Every chunk of `chunk_size` lines is loaded with COPY in its own transaction,
+    a bad chunk is rejected and reported without aborting the upload.
+    """
+    loader = SensorDataBulkLoader(format)
+    async for chunk in aiter_chunks(request.stream(), chunk_size):
+        await run_in_threadpool(loader.load_chunk, chunk)
+    return loader.finish()
+
+
+@router.get("/rollups", response_model=SensorDataRollupsPublic)
+def get_sensor_data_rollups(
+    session: SessionDep,
+    city: uuid.UUID,
+    category: str,
+    start: datetime,
+    end: datetime,
+    max_points: int = Query(default=500, ge=1, le=10_000),
+) -> Any:
+    """
+    Get min, max, avg and count of the readings of a city (station code) and
+    category between start and end, at the finest resolution (1m, 1h or 1d)
+    that fits in max_points buckets.
+    """
+    if end <= start:
+        raise HTTPException(status_code=400, detail="End must be after start")
+
+    resolution = choose_resolution(start, end, max_points)
+    statement = (
+        select(SensorDataRollup)
+        .where(
+            SensorDataRollup.resolution == resolution,
+            SensorDataRollup.city == str(city),
+            SensorDataRollup.category == category,
+            SensorDataRollup.bucket >= bucket_start(start, resolution),
+            SensorDataRollup.bucket < end,
+        )
+        .order_by(col(SensorDataRollup.bucket))
+    )
+    rollups = session.exec(statement).all()
+
+    return SensorDataRollupsPublic(
+        resolution=resolution,
+        data=[
+            SensorDataRollupPublic(
+                bucket=rollup.bucket,
+                min=rollup.min,
+                max=rollup.max,
+                avg=rollup.sum / rollup.count,
+                count=rollup.count,
+                unit=rollup.unit,
+            )
+            for rollup in rollups
+        ],
+    )
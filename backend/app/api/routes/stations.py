@@ -1,23 +1,35 @@
 from typing import Any
 
-from fastapi import APIRouter
-from sqlmodel import func, select
+from fastapi import APIRouter, Request, Response
 
-from app.api.deps import SessionDep
-from app.models import MeteorologicalStation, MeteorologicalStationsPublic
+from app.api.caching import conditional_get
+from app.api.deps import AsyncReadSessionDep
+from app.core.config import settings
+from app.models import MeteorologicalStationsPublic
+from app.stations import station_catalogue
 
 router = APIRouter()
 
 
 @router.get("/", response_model=MeteorologicalStationsPublic)
-def get_stations(session: SessionDep) -> Any:
+async def get_stations(
+    session: AsyncReadSessionDep, request: Request, response: Response
+) -> Any:
     """
     Get all meteorological stations available.
     """
 
-    count_statement = select(func.count()).select_from(MeteorologicalStation)
-    count = session.exec(count_statement).one()
-    statement = select(MeteorologicalStation)
-    stations = session.exec(statement).all()
+    snapshot = await station_catalogue.snapshot(session)
+    not_modified = conditional_get(
+        request,
+        response,
+        etag=snapshot.etag,
+        cache_control=f"public, max-age={settings.HTTP_CACHE_MAX_AGE_SECONDS}",
+    )
+    if not_modified:
+        return not_modified
 
-    return MeteorologicalStationsPublic(data=stations, count=count)
+    # All stations are returned, no need for a separate count query
+    return MeteorologicalStationsPublic(
+        data=snapshot.stations, count=len(snapshot.stations)
+    )
@@ -2,6 +2,8 @@ from fastapi import APIRouter, Depends
 from pydantic.networks import EmailStr
 
 from app.api.deps import get_current_active_superuser
+from app.core.db import async_engine, engine, pool_metrics
+from app.core.security import password_hasher
 from app.models import Message
 from app.utils import generate_test_email, send_email
 
@@ -29,3 +31,15 @@ def test_email(email_to: EmailStr) -> Message:
 @router.get("/health-check/")
 async def health_check() -> bool:
     return True
+
+
+@router.get("/metrics/", dependencies=[Depends(get_current_active_superuser)])
+def metrics() -> dict[str, dict[str, float]]:
+    """
+    Runtime metrics of the API process.
+    """
+    return {
+        "password_hasher": password_hasher.metrics(),
+        "db_pool": pool_metrics(engine),
+        "db_async_pool": pool_metrics(async_engine),
+    }
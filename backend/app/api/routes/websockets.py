@@ -1,9 +1,18 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from fastapi.responses import HTMLResponse
-from sqlmodel import Session
+import uuid
 
-from app.core.db import engine
-from app.models import SensorData
+from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import HTMLResponse
+from pydantic import ValidationError
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.core.db import async_engine
+from app.sensors.latest import latest_readings
+from app.stations import station_catalogue
+from app.websockets.broadcast import broadcast
+from app.websockets.codec import CodecError, negotiate_codec
+from app.websockets.ingest import sensor_data_buffer
+from app.websockets.manager import manager
 
 router = APIRouter()
 
@@ -34,62 +43,93 @@ html = """
 """
 
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
-
-    async def broadcast(self, data: dict):
-        for connection in self.active_connections:
-            await connection.send_json(data)
-
-
-manager = ConnectionManager()
-
-
 @router.get("/")
 def get():
     return HTMLResponse(html)
 
 
+async def resolve_station(city: str) -> uuid.UUID | None:
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        return await station_catalogue.resolve_city(session, city)
+
+
 @router.websocket("/ws/sensor/{city_code}")
-async def websocket_endpoint(websocket: WebSocket, city_code: str):
-    await manager.connect(websocket)
-    try:
-        while True:
-            sensor_data = await websocket.receive_json()
-
-            for info in sensor_data["info"]:
-                with Session(engine) as session:
-                    sensor_record = SensorData(
-                        identifier=sensor_data["identifier"],
-                        sensor=sensor_data["sensor"],
-                        city=sensor_data["city"],
-                        date=sensor_data["date"],
-                        category=info["category"],
-                        measurement=info["measurement"],
-                        unit=info["unit"],
-                    )
-                    session.add(sensor_record)
-                    session.commit()
-
-            await manager.broadcast(
-                {
-                    "city": sensor_data["city"],
-                    "category": sensor_data["info"][0]["category"],
-                    "measurement": sensor_data["info"][0]["measurement"],
-                    "unit": sensor_data["info"][0]["unit"],
-                    "date": sensor_data["date"],
-                }
-            )
-    except WebSocketDisconnect:
-        manager.disconnect(websocket)
+async def websocket_endpoint(
+    websocket: WebSocket,
+    city_code: str,
+    batch_ms: int = Query(default=0, ge=0, le=5000),
+    batch_max: int = Query(default=1, ge=1, le=1000),
+    snapshot: int = Query(default=10, ge=0, le=settings.SENSOR_LATEST_READINGS),
+):
+    """
+    Publish sensor frames of a city and subscribe to its live readings.
+
+    Subscribers can opt in to receiving lists of up to batch_max readings,
+    coalesced for batch_ms milliseconds. permessage-deflate is negotiated by
+    the server when the client offers it.
+
+    New connections first receive the last snapshot readings of each category
+    of the city, held in memory.
+
+    Cities are station codes, or station names as sent by older sensors.
+    Connections for an unknown station, or sending frames of one, are closed
+    with 1008.
+    """
+    station = await resolve_station(city_code)
+    if station is None:
+        await websocket.close(
+            code=status.WS_1008_POLICY_VIOLATION, reason="Unknown station"
+        )
+        return
+    topic = str(station)
+    # Station codes of the cities sent by this connection
+    stations = {city_code: topic}
+    # JSON unless the client offers the sensor.binary.v1 subprotocol
+    codec, subprotocol = negotiate_codec(websocket)
+    async with manager.connect(
+        websocket,
+        topic,
+        codec,
+        subprotocol,
+        batch_size=batch_max,
+        batch_interval=batch_ms / 1000,
+        snapshot=latest_readings.latest(topic, snapshot),
+    ):
+        try:
+            while True:
+                try:
+                    frame = await codec.receive_frame(websocket)
+                except (ValidationError, CodecError):
+                    await websocket.close(code=status.WS_1003_UNSUPPORTED_DATA)
+                    return
+                city = stations.get(frame.city)
+                if city is None:
+                    frame_station = await resolve_station(frame.city)
+                    if frame_station is None:
+                        await websocket.close(
+                            code=status.WS_1008_POLICY_VIOLATION,
+                            reason="Unknown station",
+                        )
+                        return
+                    city = stations[frame.city] = str(frame_station)
+                frame.city = city
+
+                readings = frame.to_readings()
+                # Only waits when the buffer is full, i.e. the database is behind
+                await sensor_data_buffer.put(readings)
+
+                if not readings:
+                    continue
+                # Delivered to the subscribers of every worker by the broadcast relay
+                await broadcast.publish(
+                    frame.city,
+                    [
+                        reading.model_dump(
+                            mode="json",
+                            include={"city", "category", "measurement", "unit", "date"},
+                        )
+                        for reading in readings
+                    ],
+                )
+        except WebSocketDisconnect:
+            pass
@@ -0,0 +1,117 @@
+import threading
+import time
+from typing import Any
+
+import jwt
+from sqlalchemy import event
+from sqlalchemy.orm import Session as ORMSession
+from sqlalchemy.orm import make_transient_to_detached
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core import security
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models import TokenPayload, User
+
+
+class AuthCache:
+    """
+    Cache of verified access tokens and of the users they authenticate, to skip
+    the signature check and the user lookup on hot tokens.
+
+    Tokens are only reused until they expire. Users are dropped as soon as a
+    change to them (deactivation, password, deletion...) is committed through
+    the ORM in this process and expire after `ttl` seconds for writes from
+    other processes.
+    """
+
+    def __init__(self, *, max_size: int, ttl: float) -> None:
+        self._tokens: TTLCache[str, tuple[float, TokenPayload]] = TTLCache(
+            max_size=max_size, ttl=ttl
+        )
+        self._users: TTLCache[str, dict[str, Any]] = TTLCache(
+            max_size=max_size, ttl=ttl
+        )
+        self._lock = threading.Lock()
+        # Bumped on every invalidation, a load that raced with a write isn't cached
+        self._generation = 0
+
+    def decode_token(self, token: str) -> TokenPayload:
+        """
+        Verify and decode an access token, raises InvalidTokenError or
+        ValidationError like jwt.decode and TokenPayload.
+        """
+        item = self._tokens.get(token)
+        if item is not None and item[0] > time.time():
+            return item[1]
+        payload = jwt.decode(
+            token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
+        )
+        token_data = TokenPayload(**payload)
+        self._tokens.set(token, (payload.get("exp", 0), token_data))
+        return token_data
+
+    def get_user(self, session: Session, user_id: str) -> User | None:
+        data = self._users.get(user_id)
+        if data is not None:
+            cached = User(**data)
+            make_transient_to_detached(cached)
+            # Attach to the session as if loaded, without a SELECT
+            return session.merge(cached, load=False)
+        generation = self._generation
+        user = session.get(User, user_id)
+        if user is not None:
+            with self._lock:
+                if generation == self._generation:
+                    self._users.set(user_id, user.model_dump())
+        return user
+
+    async def get_user_async(self, session: AsyncSession, user_id: str) -> User | None:
+        data = self._users.get(user_id)
+        if data is not None:
+            cached = User(**data)
+            make_transient_to_detached(cached)
+            return await session.merge(cached, load=False)
+        generation = self._generation
+        user = await session.get(User, user_id)
+        if user is not None:
+            with self._lock:
+                if generation == self._generation:
+                    self._users.set(user_id, user.model_dump())
+        return user
+
+    def invalidate(self, user_ids: set[str]) -> None:
+        with self._lock:
+            self._generation += 1
+            for user_id in user_ids:
+                self._users.pop(user_id)
+
+
+auth_cache = AuthCache(max_size=10_000, ttl=settings.AUTH_CACHE_TTL_SECONDS)
+
+
+# Users changed by a flush are only invalidated once the transaction commits, so
+# concurrent requests can't cache the old row again in between
+def _collect_changed_users(session: ORMSession, _flush_context: Any) -> None:
+    changed = session.info.setdefault("changed_user_ids", set())
+    changed.update(
+        str(obj.id)
+        for obj in (*session.dirty, *session.deleted)
+        if isinstance(obj, User)
+    )
+
+
+def _invalidate_changed_users(session: ORMSession) -> None:
+    changed = session.info.pop("changed_user_ids", None)
+    if changed:
+        auth_cache.invalidate(changed)
+
+
+def _discard_changed_users(session: ORMSession) -> None:
+    session.info.pop("changed_user_ids", None)
+
+
+event.listen(ORMSession, "after_flush", _collect_changed_users)
+event.listen(ORMSession, "after_commit", _invalidate_changed_users)
+event.listen(ORMSession, "after_rollback", _discard_changed_users)
@@ -68,6 +68,87 @@ class Settings(BaseSettings):
             path=self.POSTGRES_DB,
         )
 
+    # Pool of each engine (sync and async) in each API process
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30
+    DB_POOL_RECYCLE_SECONDS: int = 30 * 60
+    DB_POOL_PRE_PING: bool = True
+    # Statement timeouts in milliseconds of API requests, sensor data writes and
+    # partition maintenance, 0 disables them
+    DB_STATEMENT_TIMEOUT_MS: int = 15_000
+    DB_INGEST_STATEMENT_TIMEOUT_MS: int = 60_000
+    DB_MAINTENANCE_STATEMENT_TIMEOUT_MS: int = 0
+    # Connecting through PgBouncer in transaction pooling mode: no prepared
+    # statements, timeouts are set per transaction. LISTEN/NOTIFY broadcasts
+    # then need a direct connection (BROADCAST_DATABASE_URL).
+    DB_PGBOUNCER: bool = False
+    # Read-only replicas (comma separated postgresql+psycopg:// URLs) serving the
+    # read-only routes, a replica that fails to connect is skipped for a while
+    DB_REPLICA_URLS: Annotated[
+        list[PostgresDsn] | str, BeforeValidator(parse_cors)
+    ] = []
+    DB_REPLICA_SELECTION: Literal["round-robin", "least-loaded"] = "round-robin"
+    DB_REPLICA_RETRY_SECONDS: float = 30
+
+    # How long exact counts of list endpoints are reused for the same filters
+    COUNT_CACHE_TTL_SECONDS: float = 10
+
+    # max-age of the Cache-Control header of public read-heavy GET routes
+    HTTP_CACHE_MAX_AGE_SECONDS: int = 60
+
+    # bcrypt runs in a process pool, calls beyond MAX_PENDING are rejected with 503
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 64
+
+    # Verified tokens and their users are also invalidated on user writes, the
+    # TTL covers other processes
+    AUTH_CACHE_TTL_SECONDS: float = 30
+
+    # Stations are also invalidated on writes, the TTL covers other processes
+    STATIONS_CACHE_TTL_SECONDS: float = 5 * 60
+
+    # Write-behind buffer between the sensor WebSocket and the database
+    SENSOR_INGEST_QUEUE_SIZE: int = 10_000
+    SENSOR_INGEST_BATCH_SIZE: int = 500
+    SENSOR_INGEST_FLUSH_SECONDS: float = 0.2
+    # Messages queued per live subscriber before the oldest ones are dropped
+    SENSOR_SUBSCRIBER_QUEUE_SIZE: int = 100
+    # Recent readings kept per city to resume server-sent event streams
+    SENSOR_STREAM_BUFFER_SIZE: int = 1000
+    # Latest readings kept per city and category for snapshots and /sensors/latest
+    SENSOR_LATEST_READINGS: int = 60
+    # Cities with recent and latest readings kept in memory, the least recently
+    # published ones are evicted beyond it, as cities come from the sensors
+    SENSOR_LIVE_MAX_CITIES: int = 1000
+    # Partitions of the sensordata table, created ahead and dropped after retention
+    SENSOR_DATA_PARTITION_INTERVAL: Literal["day", "month"] = "month"
+    SENSOR_DATA_PARTITIONS_AHEAD: int = 2
+    # Keep sensor data forever unless set
+    SENSOR_DATA_RETENTION_DAYS: int | None = None
+    SENSOR_DATA_MAINTENANCE_SECONDS: int = 60 * 60
+    # "memory" only reaches subscribers of the same worker process
+    BROADCAST_BACKEND: Literal["memory", "postgres"] = "postgres"
+    # Published events waiting for the database, dropped beyond it
+    BROADCAST_QUEUE_SIZE: int = 1000
+    # Direct connection (postgresql:// URL) of the "postgres" broadcast, the
+    # database by default. Required behind PgBouncer, which doesn't keep LISTEN
+    # on a server connection between transactions.
+    BROADCAST_DATABASE_URL: PostgresDsn | None = None
+
+    @model_validator(mode="after")
+    def _check_broadcast_connection(self) -> Self:
+        if (
+            self.BROADCAST_BACKEND == "postgres"
+            and self.DB_PGBOUNCER
+            and self.BROADCAST_DATABASE_URL is None
+        ):
+            raise ValueError(
+                "BROADCAST_DATABASE_URL is required for the postgres broadcast "
+                "backend with DB_PGBOUNCER, LISTEN needs a direct connection"
+            )
+        return self
+
     SMTP_TLS: bool = True
     SMTP_SSL: bool = False
     SMTP_PORT: int = 587
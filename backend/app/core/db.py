@@ -1,10 +1,200 @@
+import itertools
+import logging
+import time
+from typing import Any, Literal
+
+from sqlalchemy import Connection, Engine, event
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.orm import Session as ORMSession
+from sqlalchemy.orm import SessionTransaction
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry, QueuePool
 from sqlmodel import Session, create_engine, select
 
 from app import crud
 from app.core.config import settings
 from app.models import User, UserCreate
 
-engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
+logger = logging.getLogger(__name__)
+
+# Workloads with their own statement timeout
+DatabaseRole = Literal["api", "ingest", "maintenance"]
+
+
+class PoolMetricsMixin:
+    """
+    Record how long checkouts wait for a connection and how often they time out.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.timeouts = 0
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        started = time.perf_counter()
+        try:
+            entry: ConnectionPoolEntry = super()._do_get()  # type: ignore[misc]
+            return entry
+        except sa_exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.checkouts += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+
+class InstrumentedQueuePool(PoolMetricsMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(PoolMetricsMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def statement_timeout(role: DatabaseRole) -> int:
+    return {
+        "api": settings.DB_STATEMENT_TIMEOUT_MS,
+        "ingest": settings.DB_INGEST_STATEMENT_TIMEOUT_MS,
+        "maintenance": settings.DB_MAINTENANCE_STATEMENT_TIMEOUT_MS,
+    }[role]
+
+
+def session_options(role: DatabaseRole) -> dict[str, Any]:
+    """
+    Session keyword arguments applying the statement timeout of a role.
+    """
+    return {"info": {"statement_timeout_ms": statement_timeout(role)}}
+
+
+def engine_options() -> dict[str, Any]:
+    connect_args: dict[str, Any] = {}
+    if settings.DB_PGBOUNCER:
+        # PgBouncer in transaction mode hands each transaction to any server
+        # connection, so prepared statements and startup options can't be used
+        connect_args["prepare_threshold"] = None
+    elif settings.DB_STATEMENT_TIMEOUT_MS:
+        connect_args["options"] = (
+            f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"
+        )
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "connect_args": connect_args,
+    }
+
+
+def pool_metrics(db_engine: Engine | AsyncEngine) -> dict[str, float]:
+    pool = db_engine.pool
+    assert isinstance(pool, PoolMetricsMixin) and isinstance(pool, QueuePool)
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+        "checkouts": pool.checkouts,
+        "wait_seconds": pool.wait_seconds,
+        "max_wait_seconds": pool.max_wait_seconds,
+        "timeouts": pool.timeouts,
+    }
+
+
+def _set_statement_timeout(
+    session: ORMSession, _transaction: SessionTransaction, connection: Connection
+) -> None:
+    timeout = session.info.get("statement_timeout_ms")
+    if timeout is None:
+        if not settings.DB_PGBOUNCER:
+            # The API timeout is already set when the connection is opened
+            return
+        timeout = settings.DB_STATEMENT_TIMEOUT_MS
+    connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout)}")
+
+
+event.listen(ORMSession, "after_begin", _set_statement_timeout)
+
+engine = create_engine(
+    str(settings.SQLALCHEMY_DATABASE_URI),
+    poolclass=InstrumentedQueuePool,
+    **engine_options(),
+)
+# Same database through the psycopg async driver, for routes running on the event loop
+async_engine = create_async_engine(
+    str(settings.SQLALCHEMY_DATABASE_URI),
+    poolclass=InstrumentedAsyncQueuePool,
+    **engine_options(),
+)
+
+
+class Replica:
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.engine = create_engine(
+            url, poolclass=InstrumentedQueuePool, **engine_options()
+        )
+        self.async_engine = create_async_engine(
+            url, poolclass=InstrumentedAsyncQueuePool, **engine_options()
+        )
+        # Skipped until then after failing to connect
+        self.down_until = 0.0
+
+
+class ReplicaRouter:
+    """
+    Pick the read replicas to try for a read-only request, in order.
+
+    Replicas are rotated round-robin or sorted by checked-out connections
+    (least-loaded). A replica failing to connect is skipped for `retry_seconds`,
+    the caller falls back to the primary when none is left.
+    """
+
+    def __init__(
+        self,
+        urls: list[str],
+        *,
+        selection: Literal["round-robin", "least-loaded"],
+        retry_seconds: float,
+    ) -> None:
+        self.replicas = [Replica(url) for url in urls]
+        self.selection = selection
+        self.retry_seconds = retry_seconds
+        self._turn = itertools.count()
+
+    def candidates(self, *, use_async: bool) -> list[Replica]:
+        now = time.monotonic()
+        healthy = [replica for replica in self.replicas if replica.down_until <= now]
+        if not healthy:
+            return []
+        if self.selection == "least-loaded":
+            return sorted(
+                healthy,
+                key=lambda replica: (
+                    replica.async_engine if use_async else replica.engine
+                ).pool.checkedout(),  # type: ignore[attr-defined]
+            )
+        start = next(self._turn) % len(healthy)
+        return healthy[start:] + healthy[:start]
+
+    def mark_down(self, replica: Replica) -> None:
+        logger.warning(
+            "Read replica %s is unavailable, skipping it for %ss",
+            replica.engine.url.render_as_string(hide_password=True),
+            self.retry_seconds,
+        )
+        replica.down_until = time.monotonic() + self.retry_seconds
+
+
+replica_router = ReplicaRouter(
+    [str(url) for url in settings.DB_REPLICA_URLS],
+    selection=settings.DB_REPLICA_SELECTION,
+    retry_seconds=settings.DB_REPLICA_RETRY_SECONDS,
+)
 
 
 # make sure all SQLModel models are imported (app.models) before initializing DB
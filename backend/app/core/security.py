@@ -1,5 +1,12 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta, timezone
-from typing import Any
+from typing import Any, TypeVar
 
 import jwt
 from passlib.context import CryptContext
@@ -11,6 +18,108 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 ALGORITHM = "HS256"
 
+T = TypeVar("T")
+
+
+class PasswordHasherOverloaded(Exception):
+    """
+    Too many password hashes are queued, the request should be retried later.
+    """
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+class PasswordHasher:
+    """
+    Size-limited process pool running bcrypt outside of the API process, so a
+    burst of logins uses several cores and doesn't hold the GIL.
+
+    Calls are rejected with PasswordHasherOverloaded instead of queued once
+    `max_pending` of them are waiting or running.
+    """
+
+    def __init__(self, *, workers: int, max_pending: int) -> None:
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.busy_seconds = 0.0
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable[..., T], *args: Any) -> "Future[T]":
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordHasherOverloaded()
+            if self._executor is None:
+                # Forking a process running threads and an event loop isn't safe
+                self._executor = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            self.pending += 1
+            executor = self._executor
+        started = time.perf_counter()
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            with self._lock:
+                self.pending -= 1
+            self._reset(executor)
+            raise
+        future.add_done_callback(lambda done: self._done(done, executor, started))
+        return future
+
+    def metrics(self) -> dict[str, float]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "pending": self.pending,
+                "max_pending": self.max_pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "average_seconds": self.busy_seconds / self.completed
+                if self.completed
+                else 0.0,
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _done(
+        self, future: "Future[Any]", executor: ProcessPoolExecutor, started: float
+    ) -> None:
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+            self.busy_seconds += time.perf_counter() - started
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self._reset(executor)
+
+    def _reset(self, executor: ProcessPoolExecutor) -> None:
+        # A worker died, the next call starts a new pool
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+)
+
 
 def create_access_token(subject: str | Any, expires_delta: timedelta) -> str:
     expire = datetime.now(timezone.utc) + expires_delta
@@ -20,8 +129,23 @@ def create_access_token(subject: str | Any, expires_delta: timedelta) -> str:
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_hasher.submit(_verify, plain_password, hashed_password).result()
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return password_hasher.submit(_hash, password).result()
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """
+    Verify a password without holding a threadpool thread while bcrypt runs.
+    """
+    future = password_hasher.submit(_verify, plain_password, hashed_password)
+    return await asyncio.wrap_future(future)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """
+    Hash a password without holding a threadpool thread while bcrypt runs.
+    """
+    return await asyncio.wrap_future(password_hasher.submit(_hash, password))
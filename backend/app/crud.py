@@ -1,15 +1,46 @@
 import uuid
+from collections.abc import Sequence
+from datetime import date
 from typing import Any
 
-from sqlmodel import Session, select
+from sqlalchemy import Boolean, Date, cast, literal_column, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlmodel import Session, col, func, select
+from starlette.concurrency import run_in_threadpool
 
-from app.core.security import get_password_hash, verify_password
-from app.models import User, UserCreate, UserUpdate
+from app.core.security import (
+    get_password_hash,
+    verify_password,
+    verify_password_async,
+)
+from app.models import (
+    SensorData,
+    SensorDataBase,
+    SensorDataRollup,
+    User,
+    UserCreate,
+    UserUpdate,
+    WeatherForecast,
+)
+from app.sensors.registry import sensor_registry
+from app.sensors.rollups import aggregate_readings
 
+# Rows per INSERT statement, PostgreSQL allows 65535 parameters per statement
+forecast_upsert_batch_size = 1000
+sensor_data_insert_batch_size = 10_000
 
-def create_user(*, session: Session, user_create: UserCreate) -> User:
+
+def create_user(
+    *, session: Session, user_create: UserCreate, hashed_password: str | None = None
+) -> User:
+    """
+    Create a user, hashing its password unless the hash is given (async
+    routes hash it with get_password_hash_async instead of blocking here).
+    """
+    if hashed_password is None:
+        hashed_password = get_password_hash(user_create.password)
     db_obj = User.model_validate(
-        user_create, update={"hashed_password": get_password_hash(user_create.password)}
+        user_create, update={"hashed_password": hashed_password}
     )
     session.add(db_obj)
     session.commit()
@@ -17,12 +48,21 @@ def create_user(*, session: Session, user_create: UserCreate) -> User:
     return db_obj
 
 
-def update_user(*, session: Session, db_user: User, user_in: UserUpdate) -> Any:
+def update_user(
+    *,
+    session: Session,
+    db_user: User,
+    user_in: UserUpdate,
+    hashed_password: str | None = None,
+) -> Any:
+    """
+    Update a user, hashing the new password if any unless the hash is given.
+    """
     user_data = user_in.model_dump(exclude_unset=True)
     extra_data = {}
     if "password" in user_data:
-        password = user_data["password"]
-        hashed_password = get_password_hash(password)
+        if hashed_password is None:
+            hashed_password = get_password_hash(user_data["password"])
         extra_data["hashed_password"] = hashed_password
     db_user.sqlmodel_update(user_data, update=extra_data)
     session.add(db_user)
@@ -44,3 +84,161 @@ def authenticate(*, session: Session, email: str, password: str) -> User | None:
     if not verify_password(password, db_user.hashed_password):
         return None
     return db_user
+
+
+async def authenticate_async(
+    *, session: Session, email: str, password: str
+) -> User | None:
+    """
+    Like authenticate, awaiting the password hasher pool instead of blocking a
+    threadpool thread on it.
+    """
+    db_user = await run_in_threadpool(get_user_by_email, session=session, email=email)
+    if not db_user:
+        return None
+    if not await verify_password_async(password, db_user.hashed_password):
+        return None
+    return db_user
+
+
+def create_sensor_data(*, session: Session, readings: Sequence[SensorDataBase]) -> int:
+    """
+    Insert the readings with multi-row INSERTs and one commit, registering new
+    sensors.
+
+    Readings of unknown stations and readings already stored for the same
+    sensor and date are skipped. Returns the number of readings stored.
+    """
+    if not readings:
+        return 0
+    resolved = sensor_registry.resolve(session, readings)
+    items = list(resolved.items())
+    stored: list[SensorDataBase] = []
+    for start in range(0, len(items), sensor_data_insert_batch_size):
+        batch = items[start : start + sensor_data_insert_batch_size]
+        statement = (
+            pg_insert(SensorData)
+            .values(
+                [
+                    {
+                        "sensor_id": sensor_id,
+                        "date": reading_date,
+                        "measurement": reading.measurement,
+                    }
+                    for (sensor_id, reading_date), reading in batch
+                ]
+            )
+            .on_conflict_do_nothing()
+            .returning(col(SensorData.sensor_id), col(SensorData.date))
+        )
+        stored.extend(resolved[key] for key in session.execute(statement).tuples())
+    upsert_sensor_data_rollups(session=session, readings=stored)
+    session.commit()
+    return len(stored)
+
+
+def copy_sensor_data(*, session: Session, readings: Sequence[SensorDataBase]) -> int:
+    """
+    Stream readings into a staging table with PostgreSQL COPY, move them to the
+    sensor data table and commit them, registering new sensors.
+
+    Skips readings like create_sensor_data, returns the number stored.
+    """
+    resolved = sensor_registry.resolve(session, readings)
+    session.execute(
+        text(
+            "CREATE TEMPORARY TABLE sensordata_staging "
+            "(sensor_id integer, date timestamp, measurement double precision) "
+            "ON COMMIT DROP"
+        )
+    )
+    dbapi_connection = session.connection().connection.driver_connection
+    assert dbapi_connection is not None
+    with dbapi_connection.cursor() as cursor:
+        with cursor.copy(
+            "COPY sensordata_staging (sensor_id, date, measurement) FROM STDIN"
+        ) as copy:
+            for (sensor_id, reading_date), reading in resolved.items():
+                copy.write_row((sensor_id, reading_date, reading.measurement))
+    keys = session.execute(
+        text(
+            "INSERT INTO sensordata (sensor_id, date, measurement) "
+            "SELECT sensor_id, date, measurement FROM sensordata_staging "
+            "ON CONFLICT DO NOTHING RETURNING sensor_id, date"
+        )
+    ).tuples()
+    stored = [resolved[key] for key in keys]
+    upsert_sensor_data_rollups(session=session, readings=stored)
+    session.commit()
+    return len(stored)
+
+
+def upsert_sensor_data_rollups(
+    *, session: Session, readings: Sequence[SensorDataBase]
+) -> None:
+    """
+    Merge the readings into the 1m/1h/1d rollups, without committing.
+    """
+    rows = aggregate_readings(readings)
+    if not rows:
+        return
+    statement = pg_insert(SensorDataRollup)
+    statement = statement.on_conflict_do_update(
+        index_elements=["resolution", "city", "category", "bucket"],
+        set_={
+            "unit": statement.excluded.unit,
+            "min": func.least(SensorDataRollup.min, statement.excluded.min),
+            "max": func.greatest(SensorDataRollup.max, statement.excluded.max),
+            "sum": SensorDataRollup.sum + statement.excluded.sum,
+            "count": SensorDataRollup.count + statement.excluded.count,
+        },
+    )
+    session.execute(statement, rows)
+
+
+def upsert_forecasts(
+    *,
+    session: Session,
+    forecasts: Sequence[WeatherForecast],
+    user_id: uuid.UUID | None = None,
+) -> dict[tuple[uuid.UUID, date], tuple[uuid.UUID, bool]]:
+    """
+    Insert forecasts or update the existing ones of the same city and day,
+    without committing. Forecasts must be unique by city and day.
+
+    When user_id is given, only forecasts of that user are updated. Returns
+    the id and whether it was created of each written forecast by city and
+    day, forecasts left untouched are missing.
+    """
+    written: dict[tuple[uuid.UUID, date], tuple[uuid.UUID, bool]] = {}
+    for start in range(0, len(forecasts), forecast_upsert_batch_size):
+        batch = forecasts[start : start + forecast_upsert_batch_size]
+        statement = pg_insert(WeatherForecast).values(
+            [forecast.model_dump() for forecast in batch]
+        )
+        upsert = statement.on_conflict_do_update(
+            index_elements=[
+                col(WeatherForecast.city_code),
+                cast(WeatherForecast.date, Date),
+            ],
+            set_={
+                name: statement.excluded[name]
+                for name in (
+                    "date",
+                    "high_temperature",
+                    "low_temperature",
+                    "wind",
+                    "humidity",
+                )
+            },
+            where=(col(WeatherForecast.user_id) == user_id) if user_id else None,
+        ).returning(
+            col(WeatherForecast.id),
+            col(WeatherForecast.city_code),
+            col(WeatherForecast.date),
+            # xmax is only set on row versions created by an update
+            literal_column("xmax = 0", Boolean),
+        )
+        for id, city_code, day, created in session.execute(upsert):
+            written[(city_code, day.date())] = (id, created)
+    return written
@@ -1,10 +1,21 @@
+import asyncio
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
+
 import sentry_sdk
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.routing import APIRoute
 from starlette.middleware.cors import CORSMiddleware
 
 from app.api.main import api_router
 from app.core.config import settings
+from app.core.db import async_engine
+from app.core.security import PasswordHasherOverloaded, password_hasher
+from app.sensors.partitions import maintain_partitions
+from app.websockets.broadcast import broadcast
+from app.websockets.ingest import sensor_data_buffer
+from app.websockets.manager import manager
 
 
 def custom_generate_unique_id(route: APIRoute) -> str:
@@ -14,8 +25,25 @@ def custom_generate_unique_id(route: APIRoute) -> str:
 if settings.SENTRY_DSN and settings.ENVIRONMENT != "local":
     sentry_sdk.init(dsn=str(settings.SENTRY_DSN), enable_tracing=True)
 
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncGenerator[None, None]:
+    sensor_data_buffer.start()
+    await broadcast.connect()
+    relay = asyncio.create_task(manager.relay(broadcast))
+    partitions = asyncio.create_task(maintain_partitions())
+    yield
+    partitions.cancel()
+    relay.cancel()
+    await broadcast.disconnect()
+    await sensor_data_buffer.stop()
+    password_hasher.shutdown()
+    await async_engine.dispose()
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
+    lifespan=lifespan,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     generate_unique_id_function=custom_generate_unique_id,
 )
@@ -30,4 +58,16 @@ if settings.all_cors_origins:
         allow_headers=["*"],
     )
 
+
+@app.exception_handler(PasswordHasherOverloaded)
+async def password_hasher_overloaded_handler(
+    _request: Request, _exc: PasswordHasherOverloaded
+) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many password checks in progress, retry later"},
+        headers={"Retry-After": "1"},
+    )
+
+
 app.include_router(api_router, prefix=settings.API_V1_STR)
@@ -1,7 +1,9 @@
 import uuid
 from datetime import datetime
+from typing import Literal
 
 from pydantic import EmailStr
+from sqlalchemy import Index, text
 from sqlmodel import Field, Relationship, SQLModel
 
 
@@ -56,7 +58,10 @@ class UserPublic(UserBase):
 
 class UsersPublic(SQLModel):
     data: list[UserPublic]
-    count: int
+    # None when requested with count="none"
+    count: int | None
+    # Pass as cursor to get the next page, None on the last page
+    next_cursor: str | None = None
 
 
 class MeteorologicalStationBase(SQLModel):
@@ -74,6 +79,7 @@ class MeteorologicalStation(MeteorologicalStationBase, table=True):
     history: list["WeatherHistory"] = Relationship(
         back_populates="city", cascade_delete=True
     )
+    sensors: list["Sensor"] = Relationship(back_populates="city", cascade_delete=True)
 
 
 class MeteorologicalStationPublic(MeteorologicalStationBase):
@@ -94,6 +100,20 @@ class WeatherForecastBase(SQLModel):
 
 
 class WeatherForecast(WeatherForecastBase, table=True):
+    __table_args__ = (
+        # One forecast per city and day, the conflict target of bulk upserts
+        Index(
+            "uq_weatherforecast_city_code_day",
+            "city_code",
+            text("CAST(date AS DATE)"),
+            unique=True,
+        ),
+        # Forecasts of a user in a city, in listing order
+        Index(
+            "ix_weatherforecast_user_id_city_code_date", "user_id", "city_code", "date"
+        ),
+    )
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     user_id: uuid.UUID = Field(
         foreign_key="user.id", nullable=False, ondelete="CASCADE"
@@ -107,13 +127,16 @@ class WeatherForecast(WeatherForecastBase, table=True):
 
 class WeatherForecastPublic(WeatherForecastBase):
     id: uuid.UUID
-    city: MeteorologicalStation
-    user: User | None
+    city: MeteorologicalStationPublic
+    user: UserPublic | None
 
 
 class WeatherForecastsPublic(SQLModel):
     data: list[WeatherForecastPublic]
-    count: int
+    # None when requested with count="none"
+    count: int | None
+    # Pass as cursor to get the next page, None on the last page
+    next_cursor: str | None = None
 
 
 class WeatherForecastCreate(WeatherForecastBase):
@@ -125,6 +148,21 @@ class WeatherForecastUpdate(WeatherForecastBase):
     city_code: uuid.UUID
 
 
+class WeatherForecastBulkOutcome(SQLModel):
+    # Position of the row in the request
+    index: int
+    status: Literal["created", "updated", "rejected"]
+    id: uuid.UUID | None = None
+    detail: str | None = None
+
+
+class WeatherForecastBulkResult(SQLModel):
+    created: int
+    updated: int
+    rejected: int
+    data: list[WeatherForecastBulkOutcome]
+
+
 class WeatherHistoryBase(SQLModel):
     date: datetime
     temperature: int
@@ -133,6 +171,11 @@ class WeatherHistoryBase(SQLModel):
 
 
 class WeatherHistory(WeatherHistoryBase, table=True):
+    __table_args__ = (
+        # History of a city in listing order, also its newest date
+        Index("ix_weatherhistory_city_code_date_id", "city_code", "date", "id"),
+    )
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     city_code: uuid.UUID = Field(
         foreign_key="meteorologicalstation.code", nullable=False, ondelete="CASCADE"
@@ -142,12 +185,15 @@ class WeatherHistory(WeatherHistoryBase, table=True):
 
 class WeatherHistoryPublic(WeatherHistoryBase):
     id: uuid.UUID
-    city: MeteorologicalStation
+    city: MeteorologicalStationPublic
 
 
 class WeatherHistorysPublic(SQLModel):
     data: list[WeatherHistoryPublic]
-    count: int
+    # None when requested with count="none"
+    count: int | None
+    # Pass as cursor to get the next page, None on the last page
+    next_cursor: str | None = None
 
 
 # Generic message
@@ -171,12 +217,143 @@ class NewPassword(SQLModel):
     new_password: str = Field(min_length=8, max_length=40)
 
 
-class SensorData(SQLModel, table=True):
-    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+class SensorDataBase(SQLModel):
+    identifier: str
+    sensor: str
+    city: str
+    category: str
+    measurement: float
+    unit: str
+    date: datetime
+
+
+# Sensor of a station reporting one category of measurements in one unit,
+# registered on its first reading by app.sensors.registry
+class Sensor(SQLModel, table=True):
+    __table_args__ = (
+        Index(
+            "uq_sensor_city_code_identifier_sensor_category_unit",
+            "city_code",
+            "identifier",
+            "sensor",
+            "category",
+            "unit",
+            unique=True,
+        ),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
     identifier: str
     sensor: str
+    category: str
+    unit: str
+    city_code: uuid.UUID = Field(
+        foreign_key="meteorologicalstation.code", nullable=False, ondelete="CASCADE"
+    )
+    city: MeteorologicalStation | None = Relationship(back_populates="sensors")
+
+
+# Readings of the registered sensors, range partitioned by date, partitions are
+# managed by app.sensors.partitions
+class SensorData(SQLModel, table=True):
+    __table_args__ = {"postgresql_partition_by": "RANGE (date)"}
+
+    # The primary key also serves queries by sensor and time range
+    sensor_id: int = Field(
+        foreign_key="sensor.id", primary_key=True, ondelete="CASCADE"
+    )
+    date: datetime = Field(primary_key=True)
+    measurement: float
+
+
+class SensorDataPublic(SensorDataBase):
+    city: uuid.UUID  # type: ignore
+    sensor_id: int
+
+
+class SensorDatasPublic(SQLModel):
+    data: list[SensorDataPublic]
+    # Pass as cursor to get the next page, None on the last page
+    next_cursor: str | None = None
+
+
+# Reading as sent to live subscribers
+class SensorReadingPublic(SQLModel):
     city: str
     category: str
     measurement: float
     unit: str
     date: datetime
+
+
+class SensorReadingsPublic(SQLModel):
+    data: list[SensorReadingPublic]
+
+
+# Aggregates of the sensor data per city, category and time bucket,
+# maintained incrementally on ingestion for resolutions "1m", "1h" and "1d"
+class SensorDataRollup(SQLModel, table=True):
+    resolution: str = Field(primary_key=True, max_length=8)
+    city: str = Field(primary_key=True)
+    category: str = Field(primary_key=True)
+    bucket: datetime = Field(primary_key=True)
+    unit: str
+    min: float
+    max: float
+    sum: float
+    count: int
+
+
+class SensorDataRollupPublic(SQLModel):
+    bucket: datetime
+    min: float
+    max: float
+    avg: float
+    count: int
+    unit: str
+
+
+class SensorDataRollupsPublic(SQLModel):
+    resolution: str
+    data: list[SensorDataRollupPublic]
+
+
+# Single measurement inside a frame sent by a sensor
+class SensorMeasurement(SQLModel):
+    category: str
+    measurement: float
+    unit: str
+
+
+# Frame sent by a sensor over the WebSocket, one or more measurements per frame
+class SensorFrame(SQLModel):
+    identifier: str
+    sensor: str
+    city: str
+    date: datetime
+    info: list[SensorMeasurement]
+
+    def to_readings(self) -> list[SensorDataBase]:
+        return [
+            SensorDataBase(
+                identifier=self.identifier,
+                sensor=self.sensor,
+                city=self.city,
+                date=self.date,
+                category=info.category,
+                measurement=info.measurement,
+                unit=info.unit,
+            )
+            for info in self.info
+        ]
+
+
+# Outcome of a bulk upload of sensor readings
+class SensorDataBulkLoadReport(SQLModel):
+    rows_loaded: int = 0
+    rows_rejected: int = 0
+    chunks_loaded: int = 0
+    chunks_rejected: int = 0
+    seconds: float = 0
+    rows_per_second: float = 0
+    errors: list[str] = Field(default_factory=list)
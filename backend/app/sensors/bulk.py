@@ -0,0 +1,152 @@
+import csv
+import json
+import logging
+import time
+from collections.abc import AsyncIterable, AsyncIterator, Iterable, Iterator
+from typing import Literal
+
+import psycopg
+from pydantic import ValidationError
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import Session
+
+from app import crud
+from app.core.db import engine, session_options
+from app.models import SensorDataBase, SensorDataBulkLoadReport, SensorFrame
+from app.sensors.registry import resolve_cities
+
+logger = logging.getLogger(__name__)
+
+BulkLoadFormat = Literal["ndjson", "csv"]
+
+max_reported_errors = 20
+
+
+class BulkLoadError(ValueError):
+    pass
+
+
+def parse_ndjson(lines: Iterable[str]) -> list[SensorDataBase]:
+    """
+    Parse NDJSON lines, each one either a single reading or a whole sensor frame.
+    """
+    readings: list[SensorDataBase] = []
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            obj = json.loads(line)
+            if isinstance(obj, dict) and "info" in obj:
+                readings.extend(SensorFrame.model_validate(obj).to_readings())
+            else:
+                readings.append(SensorDataBase.model_validate(obj))
+        except (ValueError, ValidationError) as e:
+            raise BulkLoadError(f"Invalid NDJSON row {line[:200]!r}: {e}")
+    return readings
+
+
+def parse_csv(lines: Iterable[str], fieldnames: list[str]) -> list[SensorDataBase]:
+    """
+    Parse CSV lines with the given header into readings.
+    """
+    readings: list[SensorDataBase] = []
+    for row in csv.DictReader(lines, fieldnames=fieldnames):
+        try:
+            readings.append(SensorDataBase.model_validate(row))
+        except ValidationError as e:
+            raise BulkLoadError(f"Invalid CSV row {row!r}: {e}")
+    return readings
+
+
+class SensorDataBulkLoader:
+    """
+    Load sensor readings chunk by chunk, each chunk in its own COPY and transaction.
+
+    A chunk that fails to parse or to load is rejected and reported, the rest of
+    the upload carries on.
+    """
+
+    def __init__(self, format: BulkLoadFormat) -> None:
+        self.format = format
+        self.fieldnames: list[str] | None = None
+        self.report = SensorDataBulkLoadReport()
+        self._started = time.perf_counter()
+
+    def _parse(self, lines: list[str]) -> list[SensorDataBase]:
+        if self.format == "ndjson":
+            return parse_ndjson(lines)
+        if self.fieldnames is None:
+            if not lines:
+                return []
+            self.fieldnames = next(csv.reader(lines[:1]))
+            lines = lines[1:]
+        return parse_csv(lines, self.fieldnames)
+
+    def _error(self, message: str) -> None:
+        if len(self.report.errors) < max_reported_errors:
+            self.report.errors.append(message)
+
+    def load_chunk(self, lines: list[str]) -> int:
+        try:
+            readings = self._parse(lines)
+            with Session(engine, **session_options("ingest")) as session:
+                unknown = resolve_cities(session, readings)
+                if unknown:
+                    rejected = {id(reading) for reading in unknown}
+                    readings = [r for r in readings if id(r) not in rejected]
+                loaded = crud.copy_sensor_data(session=session, readings=readings)
+        except (BulkLoadError, SQLAlchemyError, psycopg.Error) as e:
+            logger.warning("Rejected sensor data chunk: %s", e)
+            self.report.chunks_rejected += 1
+            self.report.rows_rejected += len(lines)
+            self._error(str(e).splitlines()[0])
+            return 0
+        if unknown:
+            cities = sorted({reading.city for reading in unknown})
+            self.report.rows_rejected += len(unknown)
+            self._error(
+                f"Rejected {len(unknown)} readings of unknown stations: "
+                + ", ".join(repr(city[:50]) for city in cities[:10])
+            )
+        self.report.chunks_loaded += 1
+        self.report.rows_loaded += loaded
+        return loaded
+
+    def finish(self) -> SensorDataBulkLoadReport:
+        self.report.seconds = time.perf_counter() - self._started
+        if self.report.seconds > 0:
+            self.report.rows_per_second = self.report.rows_loaded / self.report.seconds
+        return self.report
+
+
+def iter_chunks(lines: Iterable[str], chunk_size: int) -> Iterator[list[str]]:
+    chunk: list[str] = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def aiter_chunks(
+    stream: AsyncIterable[bytes], chunk_size: int
+) -> AsyncIterator[list[str]]:
+    """
+    Split a byte stream (e.g. a request body) into chunks of text lines.
+    """
+    chunk: list[str] = []
+    rest = b""
+    async for data in stream:
+        rest += data
+        *lines, rest = rest.split(b"\n")
+        for line in lines:
+            chunk.append(line.decode(errors="replace").rstrip("\r"))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if rest.strip():
+        chunk.append(rest.decode(errors="replace").rstrip("\r"))
+    if chunk:
+        yield chunk
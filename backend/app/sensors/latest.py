@@ -0,0 +1,127 @@
+from array import array
+from collections import OrderedDict
+from collections.abc import Callable
+from datetime import datetime, timedelta, timezone
+from typing import Any, TypeVar
+
+from app.core.config import settings
+from app.websockets.manager import manager
+
+T = TypeVar("T")
+
+EPOCH = datetime(1970, 1, 1)
+
+# Categories kept per city, the least recently published ones are evicted
+max_categories = 32
+
+
+def _to_microseconds(date: datetime) -> int:
+    if date.tzinfo is not None:
+        date = date.astimezone(timezone.utc).replace(tzinfo=None)
+    return (date - EPOCH) // timedelta(microseconds=1)
+
+
+class ReadingRing:
+    """
+    Last `size` measurements of one city and category, in fixed-size typed
+    arrays overwritten in a circle, so memory doesn't grow with the rate.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        # Microseconds since the epoch (UTC) and values, by slot
+        self.dates = array("q", bytes(8 * size))
+        self.values = array("d", bytes(8 * size))
+        # Number of measurements ever appended, the next slot is count % size
+        self.count = 0
+        self.unit = ""
+
+    def append(self, date: datetime, value: float, unit: str) -> None:
+        slot = self.count % self.size
+        self.dates[slot] = _to_microseconds(date)
+        self.values[slot] = value
+        self.unit = unit
+        self.count += 1
+
+    def last(self, n: int) -> list[tuple[datetime, float]]:
+        """
+        Up to the n most recent measurements, oldest first.
+        """
+        n = min(n, self.count, self.size)
+        slots = (index % self.size for index in range(self.count - n, self.count))
+        return [
+            (EPOCH + timedelta(microseconds=self.dates[slot]), self.values[slot])
+            for slot in slots
+        ]
+
+
+def _get_or_add(
+    items: OrderedDict[str, T], key: str, factory: Callable[[], T], max_size: int
+) -> T:
+    item = items.get(key)
+    if item is None:
+        item = items[key] = factory()
+        while len(items) > max_size:
+            items.popitem(last=False)
+    else:
+        items.move_to_end(key)
+    return item
+
+
+class LatestReadings:
+    """
+    Recent readings of every city and category published to live subscribers,
+    for snapshots and current conditions without querying the database.
+
+    Cities and categories come from the sensors, beyond `max_cities` cities
+    (and `max_categories` categories of a city) the least recently published
+    ones are forgotten.
+    """
+
+    def __init__(self, size: int, max_cities: int) -> None:
+        self.size = size
+        self.max_cities = max_cities
+        self.rings: OrderedDict[str, OrderedDict[str, ReadingRing]] = OrderedDict()
+
+    def add(self, city: str, reading: dict[str, Any]) -> None:
+        rings = _get_or_add(self.rings, city, OrderedDict, self.max_cities)
+        ring = _get_or_add(
+            rings, reading["category"], lambda: ReadingRing(self.size), max_categories
+        )
+        date = reading["date"]
+        if isinstance(date, str):
+            date = datetime.fromisoformat(date)
+        ring.append(date, reading["measurement"], reading["unit"])
+
+    def latest(
+        self, city: str, n: int, category: str | None = None
+    ) -> list[dict[str, Any]]:
+        """
+        The n most recent readings of each category of the city, oldest first.
+        """
+        rings: dict[str, ReadingRing] = self.rings.get(city, {})
+        if category is not None:
+            rings = {category: rings[category]} if category in rings else {}
+        measurements = sorted(
+            (date, ring_category, value, ring.unit)
+            for ring_category, ring in rings.items()
+            for date, value in ring.last(n)
+        )
+        return [
+            {
+                "city": city,
+                "category": ring_category,
+                "measurement": value,
+                "unit": unit,
+                "date": date.isoformat(),
+            }
+            for date, ring_category, value, unit in measurements
+        ]
+
+
+latest_readings = LatestReadings(
+    size=settings.SENSOR_LATEST_READINGS, max_cities=settings.SENSOR_LIVE_MAX_CITIES
+)
+
+# Filled with everything published on the broadcast, from sensors of all workers
+manager.listeners.append(latest_readings.add)
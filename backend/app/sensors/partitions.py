@@ -0,0 +1,241 @@
+import asyncio
+import logging
+import re
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Literal
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.db import engine, session_options
+
+logger = logging.getLogger(__name__)
+
+PartitionInterval = Literal["day", "month"]
+
+parent_table = "sensordata"
+# Arbitrary key for pg_try_advisory_xact_lock, so only one worker runs maintenance
+maintenance_lock_id = 409027
+# Longest wait for the lock on the parent when detaching, retried on the next run
+detach_lock_timeout_ms = 5000
+
+_bound_pattern = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+@dataclass
+class Partition:
+    name: str
+    start: datetime
+    end: datetime
+
+
+def period_start(moment: datetime, interval: PartitionInterval) -> datetime:
+    if interval == "day":
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_period(start: datetime, interval: PartitionInterval) -> datetime:
+    if interval == "day":
+        return start + timedelta(days=1)
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+def partition_name(start: datetime, interval: PartitionInterval) -> str:
+    suffix = start.strftime("%Y%m%d" if interval == "day" else "%Y%m")
+    return f"{parent_table}_p{suffix}"
+
+
+def _child_tables(session: Session) -> list[tuple[str, str]]:
+    return [
+        (name, bound)
+        for name, bound in session.execute(
+            text(
+                "SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) "
+                "FROM pg_inherits "
+                "JOIN pg_class parent ON pg_inherits.inhparent = parent.oid "
+                "JOIN pg_class child ON pg_inherits.inhrelid = child.oid "
+                "WHERE parent.relname = :parent"
+            ),
+            {"parent": parent_table},
+        ).all()
+    ]
+
+
+def list_partitions(session: Session) -> list[Partition]:
+    """
+    Range partitions of the sensor data table, without the default partition.
+    """
+    partitions = []
+    for name, bound in _child_tables(session):
+        match = _bound_pattern.search(bound)
+        if match:
+            start, end = (datetime.fromisoformat(value) for value in match.groups())
+            partitions.append(Partition(name=name, start=start, end=end))
+    return sorted(partitions, key=lambda partition: partition.start)
+
+
+def default_partition(session: Session) -> str | None:
+    for name, bound in _child_tables(session):
+        if bound == "DEFAULT":
+            return name
+    return None
+
+
+def lock_maintenance(session: Session) -> bool:
+    """
+    Try to take the maintenance lock until the end of the current transaction.
+    """
+    return bool(
+        session.execute(
+            text("SELECT pg_try_advisory_xact_lock(:id)"), {"id": maintenance_lock_id}
+        ).scalar()
+    )
+
+
+def create_partition(
+    session: Session, name: str, *, start: datetime, end: datetime
+) -> None:
+    """
+    Create the partition of the period from `start` to `end`, without committing.
+
+    It is created on its own and attached, which doesn't block reads and writes
+    of the parent like CREATE TABLE ... PARTITION OF. Readings of the period
+    that went to the default partition are moved into it first, attaching would
+    fail otherwise.
+    """
+    session.execute(text(f"CREATE TABLE {name} (LIKE {parent_table})"))
+    default = default_partition(session)
+    if default is not None:
+        session.execute(
+            text(
+                f"WITH moved AS ("
+                f"DELETE FROM {default} WHERE date >= :start AND date < :end "
+                f"RETURNING *"
+                f") INSERT INTO {name} SELECT * FROM moved"
+            ),
+            {"start": start, "end": end},
+        )
+    session.execute(
+        text(
+            f"ALTER TABLE {parent_table} ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+    )
+
+
+def ensure_partitions(
+    session: Session, *, now: datetime, ahead: int, interval: PartitionInterval
+) -> list[str]:
+    """
+    Create the partitions for the current period and `ahead` periods after it,
+    each in its own transaction.
+
+    Periods already covered, even partly, by an existing partition are skipped.
+    """
+    created = []
+    start = period_start(now, interval)
+    for _ in range(ahead + 1):
+        end = next_period(start, interval)
+        if not lock_maintenance(session):
+            session.rollback()
+            break
+        existing = list_partitions(session)
+        if not any(p.start < end and start < p.end for p in existing):
+            name = partition_name(start, interval)
+            create_partition(session, name, start=start, end=end)
+            created.append(name)
+        session.commit()
+        start = end
+    return created
+
+
+def detach_partition(session: Session, name: str) -> None:
+    """
+    Detach a partition from the sensor data table in a short transaction of its
+    own, committing.
+
+    The parent is locked exclusively until it commits, waiting at most
+    `detach_lock_timeout_ms` for the lock so queries queued behind it aren't
+    held up by a long-running one. DETACH PARTITION ... CONCURRENTLY would
+    avoid the lock but isn't allowed on tables with a default partition.
+    """
+    session.commit()
+    session.execute(text(f"SET LOCAL lock_timeout = {detach_lock_timeout_ms}"))
+    session.execute(text(f"ALTER TABLE {parent_table} DETACH PARTITION {name}"))
+    session.commit()
+
+
+def drop_expired_partitions(
+    session: Session, *, now: datetime, retention_days: int
+) -> list[str]:
+    """
+    Drop the partitions whose whole range is older than the retention period.
+
+    Each partition is detached first and dropped once it's a table of its own,
+    as dropping a partition locks the parent exclusively. A partition failing to
+    detach, e.g. on the lock timeout, is logged and left for the next run.
+    """
+    cutoff = now - timedelta(days=retention_days)
+    if not lock_maintenance(session):
+        session.rollback()
+        return []
+    expired = [p.name for p in list_partitions(session) if p.end <= cutoff]
+    session.commit()
+    dropped = []
+    for name in expired:
+        try:
+            detach_partition(session, name)
+        except DBAPIError:
+            session.rollback()
+            logger.exception("Failed to detach sensor data partition %s", name)
+            continue
+        session.execute(text(f"DROP TABLE IF EXISTS {name}"))
+        session.commit()
+        dropped.append(name)
+    return dropped
+
+
+def run_maintenance() -> None:
+    """
+    Create the upcoming partitions, then drop the expired ones, in separate
+    transactions so a failure of one doesn't roll back the other.
+    """
+    now = datetime.utcnow()
+    created: list[str] = []
+    dropped: list[str] = []
+    try:
+        with Session(engine, **session_options("maintenance")) as session:
+            created = ensure_partitions(
+                session,
+                now=now,
+                ahead=settings.SENSOR_DATA_PARTITIONS_AHEAD,
+                interval=settings.SENSOR_DATA_PARTITION_INTERVAL,
+            )
+    except Exception:
+        logger.exception("Failed to create sensor data partitions")
+    if settings.SENSOR_DATA_RETENTION_DAYS is not None:
+        with Session(engine, **session_options("maintenance")) as session:
+            dropped = drop_expired_partitions(
+                session, now=now, retention_days=settings.SENSOR_DATA_RETENTION_DAYS
+            )
+    if created or dropped:
+        logger.info("Sensor data partitions created: %s, dropped: %s", created, dropped)
+
+
+async def maintain_partitions() -> None:
+    """
+    Periodically create upcoming partitions and drop expired ones.
+    """
+    while True:
+        try:
+            await run_in_threadpool(run_maintenance)
+        except Exception:
+            logger.exception("Sensor data partition maintenance failed")
+        await asyncio.sleep(settings.SENSOR_DATA_MAINTENANCE_SECONDS)
@@ -0,0 +1,224 @@
+import logging
+import uuid
+from collections.abc import Iterable
+from datetime import datetime, timezone
+from typing import Any, NamedTuple
+
+from sqlalchemy import String, cast, event, func, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session as ORMSession
+from sqlmodel import Session, col, select
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models import MeteorologicalStation, Sensor, SensorDataBase
+
+logger = logging.getLogger(__name__)
+
+
+class SensorKey(NamedTuple):
+    city_code: uuid.UUID
+    identifier: str
+    sensor: str
+    category: str
+    unit: str
+
+
+def sensor_key(reading: SensorDataBase) -> SensorKey | None:
+    """
+    Registry key of the sensor of a reading, None if its city isn't a station code.
+    """
+    try:
+        city_code = uuid.UUID(reading.city)
+    except ValueError:
+        return None
+    return SensorKey(
+        city_code, reading.identifier, reading.sensor, reading.category, reading.unit
+    )
+
+
+def resolve_cities(
+    session: Session, readings: Iterable[SensorDataBase]
+) -> list[SensorDataBase]:
+    """
+    Set the city of the readings to the code of their station, found by code or
+    else by the name of a single station (ignoring case) as sent by older
+    sensors, like the migration of the existing readings did.
+
+    Returns the readings of cities matching no station, left unchanged.
+    """
+    readings = list(readings)
+    cities = {reading.city for reading in readings}
+    codes: dict[str, str] = {}
+    by_code = {}
+    for city in cities:
+        try:
+            by_code[uuid.UUID(city)] = city
+        except ValueError:
+            pass
+    if by_code:
+        known = session.exec(
+            select(MeteorologicalStation.code).where(
+                col(MeteorologicalStation.code).in_(by_code)
+            )
+        ).all()
+        codes.update((by_code[code], str(code)) for code in known)
+    names = {city.lower() for city in cities if city not in codes}
+    if names:
+        name = func.lower(MeteorologicalStation.name)
+        rows = session.exec(
+            select(name, func.min(cast(MeteorologicalStation.code, String)))
+            .where(name.in_(names))
+            .group_by(name)
+            .having(func.count() == 1)
+        ).all()
+        by_name = dict(rows)
+        codes.update(
+            (city, by_name[city.lower()])
+            for city in cities
+            if city not in codes and city.lower() in by_name
+        )
+    unknown = []
+    for reading in readings:
+        code = codes.get(reading.city)
+        if code is None:
+            unknown.append(reading)
+        else:
+            reading.city = code
+    return unknown
+
+
+def _naive_utc(date: datetime) -> datetime:
+    if date.tzinfo is not None:
+        date = date.astimezone(timezone.utc).replace(tzinfo=None)
+    return date
+
+
+class SensorRegistry:
+    """
+    Ids of the registered sensors by station, identifier, sensor, category and
+    unit, so writing readings doesn't look them up on every batch.
+
+    Sensors are registered in the transaction of their first readings and only
+    cached once it commits. Ids are dropped when a station is deleted through
+    the ORM in this process, as its sensors go with it, and expire after `ttl`
+    seconds for deletions from other processes.
+    """
+
+    def __init__(self, *, max_size: int, ttl: float) -> None:
+        self._ids: TTLCache[SensorKey, int] = TTLCache(max_size=max_size, ttl=ttl)
+
+    def get_ids(
+        self, session: Session, keys: Iterable[SensorKey]
+    ) -> dict[SensorKey, int]:
+        """
+        Ids of the sensors, registering the missing ones without committing.
+
+        Sensors of unknown stations are left out.
+        """
+        ids: dict[SensorKey, int] = {}
+        missing = []
+        for key in set(keys):
+            sensor_id = self._ids.get(key)
+            if sensor_id is None:
+                missing.append(key)
+            else:
+                ids[key] = sensor_id
+        if missing:
+            registered = _register_sensors(session, missing)
+            session.info.setdefault("registered_sensors", {}).update(registered)
+            ids.update(registered)
+        return ids
+
+    def resolve(
+        self, session: Session, readings: Iterable[SensorDataBase]
+    ) -> dict[tuple[int, datetime], SensorDataBase]:
+        """
+        Readings by sensor id and date (naive UTC), their primary key in the
+        sensor data table, registering new sensors without committing.
+
+        Readings of unknown stations are left out, the last one wins among
+        readings of the same sensor and date.
+        """
+        keyed = [(sensor_key(reading), reading) for reading in readings]
+        ids = self.get_ids(session, {key for key, _ in keyed if key is not None})
+        resolved: dict[tuple[int, datetime], SensorDataBase] = {}
+        skipped = 0
+        for key, reading in keyed:
+            sensor_id = ids.get(key) if key is not None else None
+            if sensor_id is None:
+                skipped += 1
+                continue
+            resolved[(sensor_id, _naive_utc(reading.date))] = reading
+        if skipped:
+            logger.warning("Skipped %d sensor readings of unknown stations", skipped)
+        return resolved
+
+    def cache(self, ids: dict[SensorKey, int]) -> None:
+        for key, sensor_id in ids.items():
+            self._ids.set(key, sensor_id)
+
+    def clear(self, *_args: Any) -> None:
+        self._ids.clear()
+
+
+def _register_sensors(session: Session, keys: list[SensorKey]) -> dict[SensorKey, int]:
+    codes = {key.city_code for key in keys}
+    known = set(
+        session.exec(
+            select(MeteorologicalStation.code).where(
+                col(MeteorologicalStation.code).in_(codes)
+            )
+        ).all()
+    )
+    # Sorted, so concurrent registrations lock the new rows in the same order
+    keys = sorted(key for key in keys if key.city_code in known)
+    if not keys:
+        return {}
+    session.execute(
+        pg_insert(Sensor)
+        .values([key._asdict() for key in keys])
+        .on_conflict_do_nothing()
+    )
+    columns = (
+        col(Sensor.city_code),
+        col(Sensor.identifier),
+        col(Sensor.sensor),
+        col(Sensor.category),
+        col(Sensor.unit),
+    )
+    sensors = session.exec(select(Sensor).where(tuple_(*columns).in_(keys))).all()
+    return {
+        SensorKey(
+            sensor.city_code,
+            sensor.identifier,
+            sensor.sensor,
+            sensor.category,
+            sensor.unit,
+        ): sensor.id
+        for sensor in sensors
+        if sensor.id is not None
+    }
+
+
+# Sensors only go away with their station, ids are kept as long as stations are
+sensor_registry = SensorRegistry(
+    max_size=100_000, ttl=settings.STATIONS_CACHE_TTL_SECONDS
+)
+
+
+# Sensors registered by a transaction are only cached once it commits, their
+# rows are gone if it rolls back
+def _cache_registered_sensors(session: ORMSession) -> None:
+    registered = session.info.pop("registered_sensors", None)
+    if registered:
+        sensor_registry.cache(registered)
+
+
+def _discard_registered_sensors(session: ORMSession) -> None:
+    session.info.pop("registered_sensors", None)
+
+
+event.listen(ORMSession, "after_commit", _cache_registered_sensors)
+event.listen(ORMSession, "after_rollback", _discard_registered_sensors)
+event.listen(MeteorologicalStation, "after_delete", sensor_registry.clear)
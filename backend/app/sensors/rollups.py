@@ -0,0 +1,75 @@
+from collections.abc import Iterable
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from app.models import SensorDataBase
+
+# Bucket size and PostgreSQL date_trunc field of each rollup resolution,
+# from the finest to the coarsest
+RESOLUTIONS: dict[str, tuple[timedelta, str]] = {
+    "1m": (timedelta(minutes=1), "minute"),
+    "1h": (timedelta(hours=1), "hour"),
+    "1d": (timedelta(days=1), "day"),
+}
+
+
+def bucket_start(moment: datetime, resolution: str) -> datetime:
+    """
+    Start of the bucket of a moment, in naive UTC like the stored readings.
+    """
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    field = RESOLUTIONS[resolution][1]
+    if field == "minute":
+        return moment.replace(second=0, microsecond=0)
+    if field == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def aggregate_readings(readings: Iterable[SensorDataBase]) -> list[dict[str, Any]]:
+    """
+    Aggregate readings into one rollup row per resolution, city, category and bucket.
+
+    Rows are sorted by primary key, so concurrent upserts lock them in the same
+    order.
+    """
+    rollups: dict[tuple[str, str, str, datetime], dict[str, Any]] = {}
+    for reading in readings:
+        for resolution in RESOLUTIONS:
+            key = (
+                resolution,
+                reading.city,
+                reading.category,
+                bucket_start(reading.date, resolution),
+            )
+            rollup = rollups.get(key)
+            if rollup is None:
+                rollups[key] = {
+                    "resolution": resolution,
+                    "city": reading.city,
+                    "category": reading.category,
+                    "bucket": key[3],
+                    "unit": reading.unit,
+                    "min": reading.measurement,
+                    "max": reading.measurement,
+                    "sum": reading.measurement,
+                    "count": 1,
+                }
+            else:
+                rollup["min"] = min(rollup["min"], reading.measurement)
+                rollup["max"] = max(rollup["max"], reading.measurement)
+                rollup["sum"] += reading.measurement
+                rollup["count"] += 1
+    return [rollups[key] for key in sorted(rollups)]
+
+
+def choose_resolution(start: datetime, end: datetime, max_points: int) -> str:
+    """
+    Pick the finest resolution that charts the range within `max_points` buckets,
+    or the coarsest one if none of them fits.
+    """
+    for resolution, (size, _) in RESOLUTIONS.items():
+        if (end - start) / size <= max_points:
+            return resolution
+    return list(RESOLUTIONS)[-1]
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session as ORMSession
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.db import async_engine
+from app.models import MeteorologicalStation, MeteorologicalStationPublic
+
+
+@dataclass(frozen=True)
+class StationSnapshot:
+    stations: list[MeteorologicalStationPublic]
+    by_code: dict[uuid.UUID, MeteorologicalStationPublic]
+    # Lowercase names held by a single station
+    by_name: dict[str, MeteorologicalStationPublic]
+    etag: str
+
+
+class StationCatalogue:
+    """
+    Cached list of the meteorological stations, rarely written and read on every
+    page load and forecast write.
+
+    Entries are detached public copies, safe to share between requests. The
+    cache is dropped whenever a station is written through the ORM in this
+    process and expires after `ttl` seconds for writes from other processes.
+    The first load after it was dropped reads the primary, a replica could
+    still miss the write and its old rows would be cached for `ttl` seconds.
+    """
+
+    def __init__(self, ttl: float) -> None:
+        self._cache: TTLCache[str, StationSnapshot] = TTLCache(max_size=1, ttl=ttl)
+        # Bumped on every write, a load that raced with a write isn't cached
+        self._generation = 0
+        self._load_from_primary = False
+
+    async def snapshot(self, session: AsyncSession) -> StationSnapshot:
+        snapshot = self._cache.get("stations")
+        if snapshot is None:
+            # No lock, it would be held across awaits on the event loop. Requests
+            # racing on an empty cache each load the small table once.
+            generation = self._generation
+            from_primary = self._load_from_primary
+            if from_primary:
+                async with AsyncSession(async_engine) as primary:
+                    snapshot = await primary.run_sync(self._load)
+            else:
+                snapshot = await session.run_sync(self._load)
+            if generation == self._generation:
+                self._cache.set("stations", snapshot)
+                if from_primary:
+                    self._load_from_primary = False
+        return snapshot
+
+    async def get_station(
+        self, session: AsyncSession, code: uuid.UUID
+    ) -> MeteorologicalStationPublic | None:
+        station = (await self.snapshot(session)).by_code.get(code)
+        if station is not None:
+            return station
+        # Could be a station added by another process since the cache was filled
+        db_station = await session.get(MeteorologicalStation, code)
+        if db_station is None:
+            return None
+        self.invalidate()
+        return MeteorologicalStationPublic.model_validate(db_station)
+
+    async def resolve_city(self, session: AsyncSession, city: str) -> uuid.UUID | None:
+        """
+        Code of the station of a city sent by sensors: a station code, or the
+        name of a single station (ignoring case) as sent by older sensors.
+        """
+        try:
+            code = uuid.UUID(city)
+        except ValueError:
+            station = (await self.snapshot(session)).by_name.get(city.lower())
+            return station.code if station is not None else None
+        return code if await self.get_station(session, code) is not None else None
+
+    def invalidate(self, *_args: Any) -> None:
+        self._generation += 1
+        self._load_from_primary = True
+        self._cache.clear()
+
+    def _load(self, session: ORMSession) -> StationSnapshot:
+        db_stations = session.scalars(select(MeteorologicalStation)).all()
+        stations = [
+            MeteorologicalStationPublic.model_validate(station)
+            for station in db_stations
+        ]
+        body = json.dumps(
+            [station.model_dump(mode="json") for station in stations], sort_keys=True
+        )
+        names = Counter(station.name.lower() for station in stations)
+        return StationSnapshot(
+            stations=stations,
+            by_code={station.code: station for station in stations},
+            by_name={
+                station.name.lower(): station
+                for station in stations
+                if names[station.name.lower()] == 1
+            },
+            etag=f'"{hashlib.sha1(body.encode()).hexdigest()}"',
+        )
+
+
+station_catalogue = StationCatalogue(ttl=settings.STATIONS_CACHE_TTL_SECONDS)
+
+
+# Stations written by a flush are only invalidated once the transaction commits,
+# so concurrent requests can't cache the old rows again in between
+def _collect_changed_stations(session: ORMSession, _flush_context: Any) -> None:
+    if any(
+        isinstance(obj, MeteorologicalStation)
+        for obj in (*session.new, *session.dirty, *session.deleted)
+    ):
+        session.info["stations_changed"] = True
+
+
+def _invalidate_changed_stations(session: ORMSession) -> None:
+    if session.info.pop("stations_changed", False):
+        station_catalogue.invalidate()
+
+
+def _discard_changed_stations(session: ORMSession) -> None:
+    session.info.pop("stations_changed", None)
+
+
+event.listen(ORMSession, "after_flush", _collect_changed_stations)
+event.listen(ORMSession, "after_commit", _invalidate_changed_stations)
+event.listen(ORMSession, "after_rollback", _discard_changed_stations)
@@ -0,0 +1,220 @@
+import uuid
+from typing import Any
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlmodel import Session
+
+from app import crud
+from app.core.config import settings
+from app.core.db import async_engine
+from app.tests.utils.forecast import create_forecasts, create_random_station
+
+
+class QueryCounter:
+    def __init__(self) -> None:
+        self.count = 0
+
+    def __call__(self, *_args: Any) -> None:
+        self.count += 1
+
+
+def count_queries(client: TestClient, url: str, **kwargs: Any) -> tuple[int, Any]:
+    counter = QueryCounter()
+    event.listen(async_engine.sync_engine, "before_cursor_execute", counter)
+    try:
+        r = client.get(url, **kwargs)
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", counter)
+    assert r.status_code == 200
+    return counter.count, r.json()
+
+
+def test_read_forecasts_fixed_query_count(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    user = crud.get_user_by_email(session=db, email=settings.EMAIL_TEST_USER)
+    assert user
+    station = create_random_station(db)
+    create_forecasts(db, user=user, station=station, days=6)
+    url = f"{settings.API_V1_STR}/forecast/"
+    # The user is looked up on the same engine until it's cached
+    client.get(url, headers=normal_user_token_headers)
+
+    queries_small, small_page = count_queries(
+        client,
+        url,
+        headers=normal_user_token_headers,
+        params={"city_code": str(station.code), "limit": 1, "count": "none"},
+    )
+    queries_large, large_page = count_queries(
+        client,
+        url,
+        headers=normal_user_token_headers,
+        params={"city_code": str(station.code), "limit": 6, "count": "none"},
+    )
+
+    assert len(small_page["data"]) == 1
+    assert len(large_page["data"]) == 6
+    assert queries_small == queries_large
+
+
+def test_read_forecasts_invalid_token(client: TestClient) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/forecast/",
+        headers={"Authorization": "Bearer invalid"},
+    )
+    assert r.status_code == 403
+
+
+def test_read_forecasts_embeds_public_user(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    user = crud.get_user_by_email(session=db, email=settings.EMAIL_TEST_USER)
+    assert user
+    station = create_random_station(db)
+    create_forecasts(db, user=user, station=station, days=1)
+
+    r = client.get(
+        f"{settings.API_V1_STR}/forecast/",
+        headers=normal_user_token_headers,
+        params={"city_code": str(station.code)},
+    )
+    forecast = r.json()["data"][0]
+    assert forecast["city"]["code"] == str(station.code)
+    assert forecast["user"]["email"] == settings.EMAIL_TEST_USER
+    assert "hashed_password" not in forecast["user"]
+
+
+def test_read_forecasts_not_modified_until_written(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    user = crud.get_user_by_email(session=db, email=settings.EMAIL_TEST_USER)
+    assert user
+    station = create_random_station(db)
+    [forecast] = create_forecasts(db, user=user, station=station, days=1)
+    url = f"{settings.API_V1_STR}/forecast/"
+    params = {"city_code": str(station.code)}
+
+    r = client.get(url, headers=normal_user_token_headers, params=params)
+    assert r.headers["Cache-Control"] == "private, no-cache"
+    etag = r.headers["ETag"]
+
+    headers = {**normal_user_token_headers, "If-None-Match": etag}
+    r = client.get(url, headers=headers, params=params)
+    assert r.status_code == 304
+
+    forecast.wind = "S"
+    db.add(forecast)
+    db.commit()
+
+    r = client.get(url, headers=headers, params=params)
+    assert r.status_code == 200
+    assert r.json()["data"][0]["wind"] == "S"
+
+
+def test_bulk_upsert_forecasts(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    station = create_random_station(db)
+    url = f"{settings.API_V1_STR}/forecast/bulk"
+
+    def row(
+        day: int, hour: int, wind: str, city_code: str = str(station.code)
+    ) -> dict[str, Any]:
+        return {
+            "date": f"2024-11-{day:02}T{hour:02}:00:00",
+            "high_temperature": 15,
+            "low_temperature": 5,
+            "wind": wind,
+            "humidity": 60,
+            "city_code": city_code,
+        }
+
+    rows = [
+        row(1, 6, "N"),
+        row(1, 12, "E"),
+        row(2, 12, "S"),
+        row(3, 12, "W", city_code=str(uuid.uuid4())),
+    ]
+    r = client.post(url, headers=normal_user_token_headers, json=rows)
+    assert r.status_code == 200
+    result = r.json()
+    assert (result["created"], result["updated"], result["rejected"]) == (2, 0, 2)
+    assert [outcome["status"] for outcome in result["data"]] == [
+        "rejected",
+        "created",
+        "created",
+        "rejected",
+    ]
+
+    r = client.post(url, headers=normal_user_token_headers, json=[row(1, 18, "NE")])
+    [outcome] = r.json()["data"]
+    assert outcome["status"] == "updated"
+    assert outcome["id"] == result["data"][1]["id"]
+
+    r = client.get(
+        f"{settings.API_V1_STR}/forecast/{outcome['id']}",
+        headers=normal_user_token_headers,
+    )
+    assert r.json()["wind"] == "NE"
+
+
+def test_bulk_upsert_forecasts_matches_days_in_utc(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    station = create_random_station(db)
+    url = f"{settings.API_V1_STR}/forecast/bulk"
+
+    def row(date: str) -> dict[str, Any]:
+        return {
+            "date": date,
+            "high_temperature": 15,
+            "low_temperature": 5,
+            "wind": "N",
+            "humidity": 60,
+            "city_code": str(station.code),
+        }
+
+    # 2024-11-11T01:00+02:00 is still the 10th in UTC
+    rows = [row("2024-11-10T12:00:00"), row("2024-11-11T01:00:00+02:00")]
+    r = client.post(url, headers=normal_user_token_headers, json=rows)
+    assert r.status_code == 200
+    assert [outcome["status"] for outcome in r.json()["data"]] == [
+        "rejected",
+        "created",
+    ]
+
+    r = client.post(
+        url,
+        headers=normal_user_token_headers,
+        json=[row("2024-11-10T20:00:00-05:00")],
+    )
+    [outcome] = r.json()["data"]
+    assert outcome["status"] == "created"
+
+
+def test_create_duplicate_forecast_for_day(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    station = create_random_station(db)
+    data = {
+        "date": "2024-11-05T08:00:00",
+        "high_temperature": 12,
+        "low_temperature": 3,
+        "wind": "N",
+        "humidity": 70,
+        "city_code": str(station.code),
+    }
+    url = f"{settings.API_V1_STR}/forecast/"
+
+    r = client.post(url, headers=normal_user_token_headers, json=data)
+    assert r.status_code == 200
+
+    r = client.post(
+        url,
+        headers=normal_user_token_headers,
+        json={**data, "date": "2024-11-05T20:00:00"},
+    )
+    assert r.status_code == 400
+    assert "already exists" in r.json()["detail"]
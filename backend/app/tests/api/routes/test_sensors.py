@@ -0,0 +1,172 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.models import MeteorologicalStation, Sensor, SensorData
+from app.tests.utils.forecast import create_random_station
+
+url = f"{settings.API_V1_STR}/sensors/"
+start = datetime(2024, 10, 22, 12)
+
+
+def create_readings(db: Session) -> MeteorologicalStation:
+    """
+    A station with a temperature and a humidity sensor, each with a reading
+    every minute for 3 minutes from `start`.
+    """
+    station = create_random_station(db)
+    sensors = [
+        Sensor(
+            city_code=station.code,
+            identifier="sensor-1",
+            sensor="TEM-456",
+            category="Temperature",
+            unit="Celsius",
+        ),
+        Sensor(
+            city_code=station.code,
+            identifier="sensor-2",
+            sensor="HUM-001",
+            category="Humidity",
+            unit="Percentage",
+        ),
+    ]
+    db.add_all(sensors)
+    db.commit()
+    for sensor in sensors:
+        assert sensor.id is not None
+        for minute in range(3):
+            db.add(
+                SensorData(
+                    sensor_id=sensor.id,
+                    date=start + timedelta(minutes=minute),
+                    measurement=float(minute),
+                )
+            )
+    db.commit()
+    return station
+
+
+def test_get_sensor_data_filters(client: TestClient, db: Session) -> None:
+    station = create_readings(db)
+    city = str(station.code)
+
+    r = client.get(url, params={"city": city})
+    assert r.status_code == 200
+    readings = r.json()["data"]
+    assert len(readings) == 6
+    assert {reading["city"] for reading in readings} == {city}
+    dates = [reading["date"] for reading in readings]
+    assert dates == sorted(dates, reverse=True)
+
+    r = client.get(url, params={"city": city, "category": "Humidity"})
+    readings = r.json()["data"]
+    assert {(r["sensor"], r["unit"]) for r in readings} == {("HUM-001", "Percentage")}
+    assert len(readings) == 3
+
+    r = client.get(url, params={"city": city, "sensor": "TEM-456"})
+    assert {reading["category"] for reading in r.json()["data"]} == {"Temperature"}
+
+    r = client.get(
+        url,
+        params={
+            "city": city,
+            "start": (start + timedelta(minutes=1)).isoformat(),
+            "end": (start + timedelta(minutes=2)).isoformat(),
+        },
+    )
+    readings = r.json()["data"]
+    assert len(readings) == 2
+    assert {reading["measurement"] for reading in readings} == {1.0}
+
+
+def test_get_sensor_data_pages(client: TestClient, db: Session) -> None:
+    station = create_readings(db)
+    params: dict[str, str | int] = {"city": str(station.code), "limit": 4}
+
+    r = client.get(url, params=params)
+    first = r.json()
+    assert len(first["data"]) == 4
+    assert first["next_cursor"]
+
+    r = client.get(url, params={**params, "cursor": first["next_cursor"]})
+    second = r.json()
+    assert len(second["data"]) == 2
+    assert second["next_cursor"] is None
+
+    keys = [
+        (reading["date"], reading["sensor_id"])
+        for reading in first["data"] + second["data"]
+    ]
+    assert len(set(keys)) == 6
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_get_sensor_data_invalid_cursor(client: TestClient) -> None:
+    r = client.get(url, params={"cursor": "invalid"})
+    assert r.status_code == 400
+
+
+def test_export_sensor_data_ndjson(client: TestClient, db: Session) -> None:
+    station = create_readings(db)
+
+    r = client.get(
+        url,
+        params={
+            "city": str(station.code),
+            "category": "Temperature",
+            "format": "ndjson",
+        },
+    )
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    readings = [json.loads(line) for line in r.text.splitlines()]
+    assert [reading["measurement"] for reading in readings] == [2.0, 1.0, 0.0]
+    assert {reading["city"] for reading in readings} == {str(station.code)}
+
+
+def test_export_sensor_data_csv(client: TestClient, db: Session) -> None:
+    station = create_readings(db)
+
+    r = client.get(url, params={"city": str(station.code), "format": "csv"})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(r.text)))
+    assert len(rows) == 6
+    assert set(rows[0]) == {
+        "identifier",
+        "sensor",
+        "city",
+        "category",
+        "measurement",
+        "unit",
+        "date",
+        "sensor_id",
+    }
+    assert {row["category"] for row in rows} == {"Temperature", "Humidity"}
+
+
+def test_live_routes_take_station_codes(client: TestClient, db: Session) -> None:
+    station = create_random_station(db)
+
+    r = client.get(f"{url}latest", params={"city": str(station.code)})
+    assert r.status_code == 200
+    assert r.json()["data"] == []
+
+    r = client.get(f"{url}latest", params={"city": station.name})
+    assert r.status_code == 422
+    r = client.get(
+        f"{url}rollups",
+        params={
+            "city": station.name,
+            "category": "Temperature",
+            "start": start.isoformat(),
+            "end": (start + timedelta(hours=1)).isoformat(),
+        },
+    )
+    assert r.status_code == 422
@@ -0,0 +1,87 @@
+from collections.abc import AsyncGenerator
+from datetime import datetime
+from typing import Any
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.api.deps import get_async_read_db
+from app.core.config import settings
+from app.main import app
+from app.models import MeteorologicalStation
+from app.stations import station_catalogue
+from app.tests.utils.forecast import create_random_station
+
+
+def test_get_stations_etag(client: TestClient, db: Session) -> None:
+    station = create_random_station(db)
+
+    r = client.get(f"{settings.API_V1_STR}/stations/")
+    assert r.status_code == 200
+    assert str(station.code) in {s["code"] for s in r.json()["data"]}
+    etag = r.headers["ETag"]
+
+    r = client.get(f"{settings.API_V1_STR}/stations/", headers={"If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.content == b""
+
+
+def test_get_stations_invalidated_on_write(client: TestClient, db: Session) -> None:
+    r = client.get(f"{settings.API_V1_STR}/stations/")
+    etag = r.headers["ETag"]
+
+    station = create_random_station(db)
+
+    r = client.get(f"{settings.API_V1_STR}/stations/", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["ETag"] != etag
+    assert str(station.code) in {s["code"] for s in r.json()["data"]}
+
+
+def test_get_stations_not_invalidated_by_rolled_back_write(
+    client: TestClient, db: Session
+) -> None:
+    r = client.get(f"{settings.API_V1_STR}/stations/")
+    etag = r.headers["ETag"]
+
+    db.add(
+        MeteorologicalStation(
+            name="rolled back",
+            latitude=51.5,
+            longitude=-0.12,
+            date_of_installation=datetime(2020, 1, 1),
+        )
+    )
+    db.flush()
+    db.rollback()
+    assert len(station_catalogue._cache) == 1
+
+    r = client.get(f"{settings.API_V1_STR}/stations/", headers={"If-None-Match": etag})
+    assert r.status_code == 304
+
+
+class LaggingReplicaSession:
+    """
+    Read session of a replica that hasn't received the latest writes.
+    """
+
+    async def run_sync(self, _fn: Any) -> Any:
+        raise AssertionError("The stations were loaded from the replica")
+
+
+async def get_lagging_replica() -> AsyncGenerator[Any, None]:
+    yield LaggingReplicaSession()
+
+
+def test_get_stations_reloaded_from_primary_after_write(
+    client: TestClient, db: Session
+) -> None:
+    station = create_random_station(db)
+
+    app.dependency_overrides[get_async_read_db] = get_lagging_replica
+    try:
+        r = client.get(f"{settings.API_V1_STR}/stations/")
+        assert r.status_code == 200
+        assert str(station.code) in {s["code"] for s in r.json()["data"]}
+    finally:
+        del app.dependency_overrides[get_async_read_db]
@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta, timezone
+
+from fastapi import Request, Response
+
+from app.api.caching import conditional_get, make_etag
+
+
+def make_request(**headers: str) -> Request:
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "headers": [
+                (name.replace("_", "-").encode(), value.encode())
+                for name, value in headers.items()
+            ],
+        }
+    )
+
+
+def test_make_etag_depends_on_parts() -> None:
+    assert make_etag("a", 1) == make_etag("a", 1)
+    assert make_etag("a", 1) != make_etag("a", 2)
+
+
+def test_conditional_get_sets_headers() -> None:
+    response = Response()
+    last_modified = datetime(2024, 10, 22, 12, 30, 15)
+    not_modified = conditional_get(
+        make_request(),
+        response,
+        etag='"v1"',
+        cache_control="public, max-age=60",
+        last_modified=last_modified,
+    )
+    assert not_modified is None
+    assert response.headers["ETag"] == '"v1"'
+    assert response.headers["Cache-Control"] == "public, max-age=60"
+    assert response.headers["Last-Modified"] == "Tue, 22 Oct 2024 12:30:15 GMT"
+
+
+def test_conditional_get_if_none_match() -> None:
+    not_modified = conditional_get(
+        make_request(if_none_match='W/"v0", "v1"'),
+        Response(),
+        etag='"v1"',
+        cache_control="no-cache",
+    )
+    assert not_modified is not None
+    assert not_modified.status_code == 304
+    assert not_modified.headers["ETag"] == '"v1"'
+
+    stale = conditional_get(
+        make_request(if_none_match='"v0"'),
+        Response(),
+        etag='"v1"',
+        cache_control="no-cache",
+    )
+    assert stale is None
+
+
+def test_conditional_get_if_modified_since() -> None:
+    last_modified = datetime(2024, 10, 22, 12, 30, 15, 500, tzinfo=timezone.utc)
+
+    not_modified = conditional_get(
+        make_request(if_modified_since="Tue, 22 Oct 2024 12:30:15 GMT"),
+        Response(),
+        etag='"v1"',
+        cache_control="no-cache",
+        last_modified=last_modified,
+    )
+    assert not_modified is not None
+    assert not_modified.status_code == 304
+
+    modified = conditional_get(
+        make_request(if_modified_since="Tue, 22 Oct 2024 12:30:15 GMT"),
+        Response(),
+        etag='"v1"',
+        cache_control="no-cache",
+        last_modified=last_modified + timedelta(seconds=1),
+    )
+    assert modified is None
+
+
+def test_conditional_get_etag_takes_precedence() -> None:
+    not_modified = conditional_get(
+        make_request(
+            if_none_match='"v0"', if_modified_since="Tue, 22 Oct 2024 12:30:15 GMT"
+        ),
+        Response(),
+        etag='"v1"',
+        cache_control="no-cache",
+        last_modified=datetime(2024, 10, 22),
+    )
+    assert not_modified is None
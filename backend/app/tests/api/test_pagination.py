@@ -0,0 +1,21 @@
+import uuid
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.pagination import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip() -> None:
+    date = datetime(2024, 10, 22, 12, 30, 15, 123)
+    id = uuid.uuid4()
+    cursor = encode_cursor(date, id)
+    assert decode_cursor(cursor, datetime.fromisoformat, uuid.UUID) == (date, id)
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", encode_cursor("a"), ""])
+def test_invalid_cursor(cursor: str) -> None:
+    with pytest.raises(HTTPException) as e:
+        decode_cursor(cursor, datetime.fromisoformat, uuid.UUID)
+    assert e.value.status_code == 400
@@ -0,0 +1,54 @@
+import asyncio
+import json
+from typing import Any
+
+from app.api.routes.sensors import stream_events
+from app.websockets.manager import manager
+
+
+def reading(measurement: float) -> dict[str, Any]:
+    return {
+        "city": "Stream City",
+        "category": "Temperature",
+        "measurement": measurement,
+        "unit": "Celsius",
+        "date": f"2024-10-22T12:00:0{measurement:.0f}",
+    }
+
+
+def test_stream_events_replays_then_streams_live() -> None:
+    async def run() -> list[str]:
+        manager.publish("Stream City", reading(1))
+        manager.publish("Stream City", reading(2))
+        [(first_id, _), _] = manager.recent.since("Stream City", 0)
+
+        events = stream_events("Stream City", first_id)
+        received = [await anext(events)]
+        manager.publish("Stream City", reading(3))
+        received.append(await anext(events))
+        await events.aclose()
+        return received
+
+    received = asyncio.run(run())
+    assert [json.loads(event.split("data: ")[1]) for event in received] == [
+        reading(2),
+        reading(3),
+    ]
+    assert all(event.startswith("id: ") for event in received)
+    assert "Stream City" not in manager.topics
+
+
+def test_stream_events_without_last_event_id_starts_live() -> None:
+    async def run() -> list[str]:
+        manager.publish("Stream City", reading(1))
+
+        events = stream_events("Stream City", None)
+        next_event = asyncio.ensure_future(anext(events))
+        await asyncio.sleep(0)
+        manager.publish("Stream City", reading(2))
+        received = [await next_event]
+        await events.aclose()
+        return received
+
+    received = asyncio.run(run())
+    assert [json.loads(event.split("data: ")[1]) for event in received] == [reading(2)]
@@ -0,0 +1,45 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy import exc as sa_exc
+
+from app.core.db import InstrumentedQueuePool, ReplicaRouter, pool_metrics
+
+
+def test_pool_metrics_record_checkouts_and_timeouts() -> None:
+    engine = create_engine(
+        "sqlite://",
+        poolclass=InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.05,
+    )
+    with engine.connect():
+        assert pool_metrics(engine)["checked_out"] == 1
+        with pytest.raises(sa_exc.TimeoutError):
+            engine.connect()
+
+    metrics = pool_metrics(engine)
+    assert metrics["checked_out"] == 0
+    assert metrics["checkouts"] == 2
+    assert metrics["timeouts"] == 1
+    assert metrics["max_wait_seconds"] >= 0.05
+
+
+def test_replica_router_rotates_and_skips_failed_replicas() -> None:
+    router = ReplicaRouter(
+        [
+            "postgresql+psycopg://app@replica-1/app",
+            "postgresql+psycopg://app@replica-2/app",
+        ],
+        selection="round-robin",
+        retry_seconds=60,
+    )
+    first, second = router.replicas
+
+    assert router.candidates(use_async=False) == [first, second]
+    assert router.candidates(use_async=True) == [second, first]
+
+    router.mark_down(first)
+    assert router.candidates(use_async=False) == [second]
+    router.mark_down(second)
+    assert router.candidates(use_async=False) == []
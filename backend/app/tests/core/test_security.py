@@ -0,0 +1,52 @@
+import asyncio
+import time
+from collections.abc import Callable
+
+import pytest
+
+from app.core.security import (
+    PasswordHasher,
+    PasswordHasherOverloaded,
+    _hash,
+    _verify,
+    get_password_hash,
+    password_hasher,
+    verify_password,
+    verify_password_async,
+)
+
+
+def wait_for(condition: Callable[[], bool], timeout: float = 5.0) -> None:
+    """
+    Poll until the condition holds: a future's done callbacks, which update the
+    hasher metrics, run after its result() callers are woken up.
+    """
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_password_hash_round_trip() -> None:
+    hashed = get_password_hash("secret")
+    assert verify_password("secret", hashed)
+    assert not verify_password("wrong", hashed)
+    assert asyncio.run(verify_password_async("secret", hashed))
+    wait_for(lambda: password_hasher.metrics()["pending"] == 0)
+
+
+def test_password_hasher_rejects_when_overloaded() -> None:
+    hasher = PasswordHasher(workers=1, max_pending=1)
+    try:
+        first = hasher.submit(_hash, "secret")
+        with pytest.raises(PasswordHasherOverloaded):
+            hasher.submit(_verify, "secret", "hash")
+        assert _verify("secret", first.result())
+
+        wait_for(lambda: hasher.metrics()["completed"] == 1)
+        metrics = hasher.metrics()
+        assert metrics["rejected"] == 1
+        assert metrics["completed"] == 1
+        assert metrics["pending"] == 0
+    finally:
+        hasher.shutdown()
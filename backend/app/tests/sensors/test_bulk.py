@@ -0,0 +1,82 @@
+import asyncio
+import json
+from collections.abc import AsyncIterator
+
+import pytest
+from sqlmodel import Session
+
+from app.sensors.bulk import (
+    BulkLoadError,
+    SensorDataBulkLoader,
+    aiter_chunks,
+    parse_csv,
+    parse_ndjson,
+)
+from app.tests.utils.forecast import create_random_station
+
+
+def test_parse_ndjson_readings_and_frames() -> None:
+    lines = [
+        '{"identifier": "a", "sensor": "TEM-456", "city": "London", "category": "Temperature", "measurement": 21.5, "unit": "Celsius", "date": "2024-10-22T12:00:00"}',
+        "",
+        '{"identifier": "b", "sensor": "HUM-001", "city": "London", "date": "2024-10-22T12:00:00", "info": [{"category": "Humidity", "measurement": 40, "unit": "Percentage"}, {"category": "Wind", "measurement": 3, "unit": "m/s"}]}',
+    ]
+    readings = parse_ndjson(lines)
+    assert [r.category for r in readings] == ["Temperature", "Humidity", "Wind"]
+    assert readings[2].identifier == "b"
+
+
+def test_parse_ndjson_rejects_invalid_row() -> None:
+    with pytest.raises(BulkLoadError):
+        parse_ndjson(['{"identifier": "a"}'])
+
+
+def test_parse_csv() -> None:
+    fieldnames = [
+        "identifier",
+        "sensor",
+        "city",
+        "category",
+        "measurement",
+        "unit",
+        "date",
+    ]
+    readings = parse_csv(
+        ["a,TEM-456,London,Temperature,21.5,Celsius,2024-10-22 12:00:00"], fieldnames
+    )
+    assert readings[0].measurement == 21.5
+    with pytest.raises(BulkLoadError):
+        parse_csv(["a,TEM-456,London,Temperature,warm,Celsius,2024-10-22"], fieldnames)
+
+
+def test_aiter_chunks_splits_lines_across_reads() -> None:
+    async def body() -> AsyncIterator[bytes]:
+        yield b"one\ntw"
+        yield b"o\r\nthree\nfour"
+
+    async def collect() -> list[list[str]]:
+        return [chunk async for chunk in aiter_chunks(body(), 3)]
+
+    assert asyncio.run(collect()) == [["one", "two", "three"], ["four"]]
+
+
+def test_load_chunk_rejects_readings_of_unknown_stations(db: Session) -> None:
+    station = create_random_station(db)
+    row = {
+        "identifier": "bulk",
+        "sensor": "TEM-456",
+        "category": "Temperature",
+        "measurement": 21.5,
+        "unit": "Celsius",
+        "date": "2024-10-22T12:00:00",
+    }
+    lines = [
+        json.dumps({**row, "city": station.name}),
+        json.dumps({**row, "city": "Atlantis"}),
+    ]
+    loader = SensorDataBulkLoader("ndjson")
+
+    assert loader.load_chunk(lines) == 1
+    report = loader.finish()
+    assert (report.rows_loaded, report.rows_rejected) == (1, 1)
+    assert report.errors == ["Rejected 1 readings of unknown stations: 'Atlantis'"]
@@ -0,0 +1,88 @@
+from datetime import datetime
+
+import pytest
+
+from app.sensors import latest as latest_module
+from app.sensors.latest import LatestReadings, ReadingRing
+
+
+def test_ring_keeps_last_measurements_in_order() -> None:
+    ring = ReadingRing(size=3)
+    assert ring.last(2) == []
+    for second in range(5):
+        ring.append(datetime(2024, 10, 22, 12, 0, second), float(second), "Celsius")
+
+    assert ring.last(10) == [
+        (datetime(2024, 10, 22, 12, 0, 2), 2.0),
+        (datetime(2024, 10, 22, 12, 0, 3), 3.0),
+        (datetime(2024, 10, 22, 12, 0, 4), 4.0),
+    ]
+    assert ring.last(1) == [(datetime(2024, 10, 22, 12, 0, 4), 4.0)]
+
+
+def test_latest_readings_per_category() -> None:
+    latest = LatestReadings(size=2, max_cities=10)
+    for second, category, unit in [
+        (1, "Temperature", "Celsius"),
+        (2, "Humidity", "Percentage"),
+        (3, "Temperature", "Celsius"),
+    ]:
+        latest.add(
+            "London",
+            {
+                "city": "London",
+                "category": category,
+                "measurement": float(second),
+                "unit": unit,
+                "date": f"2024-10-22T12:00:0{second}",
+            },
+        )
+
+    assert latest.latest("London", 1) == [
+        {
+            "city": "London",
+            "category": "Humidity",
+            "measurement": 2.0,
+            "unit": "Percentage",
+            "date": "2024-10-22T12:00:02",
+        },
+        {
+            "city": "London",
+            "category": "Temperature",
+            "measurement": 3.0,
+            "unit": "Celsius",
+            "date": "2024-10-22T12:00:03",
+        },
+    ]
+    temperatures = latest.latest("London", 2, category="Temperature")
+    assert [reading["measurement"] for reading in temperatures] == [1.0, 3.0]
+    assert latest.latest("London", 2, category="Wind") == []
+    assert latest.latest("Paris", 2) == []
+
+
+def test_latest_readings_forget_least_recent_city_and_category(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(latest_module, "max_categories", 2)
+    latest = LatestReadings(size=2, max_cities=2)
+
+    def add(city: str, category: str) -> None:
+        reading = {
+            "city": city,
+            "category": category,
+            "measurement": 1.0,
+            "unit": "",
+            "date": "2024-10-22T12:00:00",
+        }
+        latest.add(city, reading)
+
+    add("London", "Temperature")
+    add("Athens", "Temperature")
+    add("London", "Humidity")
+    add("Paris", "Temperature")
+    assert list(latest.rings) == ["London", "Paris"]
+    assert latest.latest("Athens", 1) == []
+
+    add("London", "Temperature")
+    add("London", "Wind")
+    assert list(latest.rings["London"]) == ["Temperature", "Wind"]
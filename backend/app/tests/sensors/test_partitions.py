@@ -0,0 +1,82 @@
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlmodel import Session, select
+
+from app.models import Sensor, SensorData
+from app.sensors.partitions import (
+    create_partition,
+    drop_expired_partitions,
+    ensure_partitions,
+    list_partitions,
+    next_period,
+    partition_name,
+    period_start,
+)
+from app.tests.utils.forecast import create_random_station
+
+
+def test_monthly_periods() -> None:
+    start = period_start(datetime(2024, 12, 17, 13, 45), "month")
+    assert start == datetime(2024, 12, 1)
+    assert next_period(start, "month") == datetime(2025, 1, 1)
+    assert partition_name(start, "month") == "sensordata_p202412"
+
+
+def test_daily_periods() -> None:
+    start = period_start(datetime(2024, 2, 28, 23, 59), "day")
+    assert start == datetime(2024, 2, 28)
+    assert next_period(start, "day") == datetime(2024, 2, 29)
+    assert partition_name(start, "day") == "sensordata_p20240228"
+
+
+def test_ensure_partitions_moves_readings_out_of_default(db: Session) -> None:
+    station = create_random_station(db)
+    sensor = Sensor(
+        city_code=station.code,
+        identifier="partition",
+        sensor="TEM-456",
+        category="Temperature",
+        unit="Celsius",
+    )
+    db.add(sensor)
+    db.commit()
+    assert sensor.id is not None
+    # Far enough ahead that no partition covers it yet
+    date = datetime(2090, 3, 14, 12)
+    db.add(SensorData(sensor_id=sensor.id, date=date, measurement=21.5))
+    db.commit()
+
+    created = ensure_partitions(db, now=date, ahead=0, interval="month")
+    try:
+        assert created == ["sensordata_p209003"]
+        assert "sensordata_p209003" in {p.name for p in list_partitions(db)}
+        moved = db.execute(
+            text("SELECT sensor_id FROM sensordata_p209003 WHERE date = :date"),
+            {"date": date},
+        ).scalars()
+        assert moved.all() == [sensor.id]
+        readings = db.exec(
+            select(SensorData).where(SensorData.sensor_id == sensor.id)
+        ).all()
+        assert [reading.measurement for reading in readings] == [21.5]
+    finally:
+        db.rollback()
+        db.execute(text("DROP TABLE IF EXISTS sensordata_p209003"))
+        db.delete(station)
+        db.commit()
+
+
+def test_drop_expired_partitions_detaches_and_drops(db: Session) -> None:
+    # Older than any partition created by the migrations or maintenance
+    create_partition(
+        db, "sensordata_p200101", start=datetime(2001, 1, 1), end=datetime(2001, 2, 1)
+    )
+    db.commit()
+
+    dropped = drop_expired_partitions(db, now=datetime(2001, 3, 1), retention_days=7)
+
+    assert dropped == ["sensordata_p200101"]
+    assert "sensordata_p200101" not in {p.name for p in list_partitions(db)}
+    exists = db.execute(text("SELECT to_regclass('sensordata_p200101')")).scalar()
+    assert exists is None
@@ -0,0 +1,82 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlmodel import Session
+
+from app.models import SensorDataBase
+from app.sensors.registry import (
+    SensorKey,
+    resolve_cities,
+    sensor_key,
+    sensor_registry,
+)
+from app.tests.utils.forecast import create_random_station
+
+
+def make_reading(city: str, measurement: float, date: datetime) -> SensorDataBase:
+    return SensorDataBase(
+        identifier="a",
+        sensor="TEM-456",
+        city=city,
+        category="Temperature",
+        measurement=measurement,
+        unit="Celsius",
+        date=date,
+    )
+
+
+def test_sensor_key_needs_a_station_code() -> None:
+    code = uuid.uuid4()
+    date = datetime(2024, 10, 22, 12)
+    assert sensor_key(make_reading(str(code), 21.5, date)) == SensorKey(
+        code, "a", "TEM-456", "Temperature", "Celsius"
+    )
+    assert sensor_key(make_reading("London", 21.5, date)) is None
+
+
+def test_registered_sensors_are_cached_on_commit() -> None:
+    committed = SensorKey(uuid.uuid4(), "a", "TEM-456", "Temperature", "Celsius")
+    rolled_back = SensorKey(uuid.uuid4(), "a", "TEM-456", "Temperature", "Celsius")
+
+    with Session() as session:
+        session.info["registered_sensors"] = {rolled_back: 1}
+        session.rollback()
+        session.info["registered_sensors"] = {committed: 2}
+        session.commit()
+        # Served from the cache, the session has no database to query
+        assert sensor_registry.get_ids(session, [committed]) == {committed: 2}
+    assert sensor_registry._ids.get(rolled_back) is None
+
+
+def test_resolve_keys_readings_by_sensor_and_date() -> None:
+    code = uuid.uuid4()
+    sensor_registry.cache(
+        {SensorKey(code, "a", "TEM-456", "Temperature", "Celsius"): 7}
+    )
+    date = datetime(2024, 10, 22, 12)
+    readings = [
+        make_reading(str(code), 21.5, date),
+        make_reading(str(code), 22.0, date.replace(tzinfo=timezone.utc)),
+        make_reading(str(code), 23.0, date + timedelta(minutes=1)),
+        make_reading("London", 24.0, date),
+    ]
+
+    with Session() as session:
+        resolved = sensor_registry.resolve(session, readings)
+
+    assert {key: reading.measurement for key, reading in resolved.items()} == {
+        (7, date): 22.0,
+        (7, date + timedelta(minutes=1)): 23.0,
+    }
+
+
+def test_resolve_cities_by_code_or_station_name(db: Session) -> None:
+    station = create_random_station(db)
+    date = datetime(2024, 10, 22, 12)
+    by_code = make_reading(str(station.code).upper(), 21.5, date)
+    by_name = make_reading(station.name.upper(), 22.0, date)
+    unknown = make_reading(f"nowhere-{uuid.uuid4()}", 23.0, date)
+
+    assert resolve_cities(db, [by_code, by_name, unknown]) == [unknown]
+    assert by_code.city == by_name.city == str(station.code)
+    assert unknown.city.startswith("nowhere-")
@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta, timezone
+
+from app.models import SensorDataBase
+from app.sensors.rollups import aggregate_readings, choose_resolution
+
+
+def make_reading(measurement: float, date: datetime) -> SensorDataBase:
+    return SensorDataBase(
+        identifier="sensor-1",
+        sensor="TEM-456",
+        city="London",
+        category="Temperature",
+        measurement=measurement,
+        unit="Celsius",
+        date=date,
+    )
+
+
+def test_aggregate_readings_per_resolution() -> None:
+    readings = [
+        make_reading(10, datetime(2024, 10, 22, 12, 0, 5)),
+        make_reading(20, datetime(2024, 10, 22, 12, 0, 35)),
+        make_reading(30, datetime(2024, 10, 22, 12, 1, 5)),
+    ]
+    rollups = aggregate_readings(readings)
+    minutes = [r for r in rollups if r["resolution"] == "1m"]
+    hours = [r for r in rollups if r["resolution"] == "1h"]
+
+    assert len(minutes) == 2
+    assert minutes[0]["bucket"] == datetime(2024, 10, 22, 12, 0)
+    assert (minutes[0]["min"], minutes[0]["max"], minutes[0]["count"]) == (10, 20, 2)
+    assert len(hours) == 1
+    assert (hours[0]["sum"], hours[0]["count"]) == (60, 3)
+
+
+def test_aggregate_readings_buckets_in_utc() -> None:
+    offset = timezone(timedelta(hours=2))
+    readings = [
+        make_reading(10, datetime(2024, 10, 23, 1, 30, tzinfo=offset)),
+        make_reading(20, datetime(2024, 10, 22, 23, 45)),
+    ]
+    rollups = aggregate_readings(readings)
+    days = [r for r in rollups if r["resolution"] == "1d"]
+
+    assert [(r["bucket"], r["count"]) for r in days] == [(datetime(2024, 10, 22), 2)]
+
+
+def test_choose_resolution_fits_point_budget() -> None:
+    start = datetime(2024, 10, 1)
+    assert choose_resolution(start, start + timedelta(hours=2), 500) == "1m"
+    assert choose_resolution(start, start + timedelta(days=7), 500) == "1h"
+    assert choose_resolution(start, start + timedelta(days=365), 500) == "1d"
+    assert choose_resolution(start, start + timedelta(days=3650), 500) == "1d"
@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+
+from sqlmodel import Session
+
+from app.models import MeteorologicalStation, User, WeatherForecast
+from app.tests.utils.utils import random_lower_string
+
+
+def create_random_station(db: Session) -> MeteorologicalStation:
+    station = MeteorologicalStation(
+        name=random_lower_string(),
+        latitude=51.5,
+        longitude=-0.12,
+        date_of_installation=datetime(2020, 1, 1),
+    )
+    db.add(station)
+    db.commit()
+    db.refresh(station)
+    return station
+
+
+def create_forecasts(
+    db: Session, *, user: User, station: MeteorologicalStation, days: int
+) -> list[WeatherForecast]:
+    start = datetime(2024, 10, 22)
+    forecasts = [
+        WeatherForecast(
+            date=start + timedelta(days=day),
+            high_temperature=20,
+            low_temperature=10,
+            wind="N",
+            humidity=50,
+            user_id=user.id,
+            city_code=station.code,
+        )
+        for day in range(days)
+    ]
+    db.add_all(forecasts)
+    db.commit()
+    return forecasts
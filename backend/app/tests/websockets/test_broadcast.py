@@ -0,0 +1,63 @@
+import asyncio
+import json
+from typing import Any
+
+import pytest
+from pydantic import ValidationError
+
+from app.core.config import Settings
+from app.websockets.broadcast import PostgresBroadcast, notify_payloads
+
+
+def test_notify_payloads_split_to_fit() -> None:
+    messages = [{"measurement": i, "unit": "x" * 40} for i in range(10)]
+    payloads = notify_payloads("London", messages, max_bytes=200)
+
+    assert len(payloads) > 1
+    assert all(len(payload.encode()) <= 200 for payload in payloads)
+    events = [json.loads(payload) for payload in payloads]
+    assert {event["topic"] for event in events} == {"London"}
+    assert [m for event in events for m in event["messages"]] == messages
+
+
+def test_notify_payloads_leave_out_oversized_messages() -> None:
+    messages: list[dict[str, Any]] = [
+        {"measurement": 1},
+        {"unit": "x" * 300},
+        {"measurement": 2},
+    ]
+    [payload] = notify_payloads("London", messages, max_bytes=200)
+    assert json.loads(payload)["messages"] == [{"measurement": 1}, {"measurement": 2}]
+
+
+def test_postgres_publish_doesnt_wait_for_the_database() -> None:
+    async def run() -> PostgresBroadcast:
+        # Nothing listens on this port, sending fails in the background
+        broadcast = PostgresBroadcast(
+            "postgresql://nobody@127.0.0.1:1/none", max_queue_size=2
+        )
+        broadcast.reconnect_wait_seconds = 10
+        await broadcast.connect()
+        for i in range(5):
+            await asyncio.wait_for(
+                broadcast.publish("London", [{"measurement": i}]), 0.1
+            )
+        await broadcast.disconnect()
+        return broadcast
+
+    broadcast = asyncio.run(run())
+    assert broadcast.dropped >= 3
+
+
+def test_postgres_broadcast_behind_pgbouncer_needs_direct_url() -> None:
+    with pytest.raises(ValidationError):
+        Settings.model_validate({"DB_PGBOUNCER": True, "BROADCAST_BACKEND": "postgres"})
+
+    direct = Settings.model_validate(
+        {
+            "DB_PGBOUNCER": True,
+            "BROADCAST_BACKEND": "postgres",
+            "BROADCAST_DATABASE_URL": "postgresql://app@db:5432/app",
+        }
+    )
+    assert str(direct.BROADCAST_DATABASE_URL) == "postgresql://app@db:5432/app"
@@ -0,0 +1,140 @@
+import asyncio
+from collections.abc import MutableMapping
+from datetime import datetime, timezone
+from typing import Any
+
+import pytest
+from fastapi import WebSocket
+
+from app.models import SensorFrame, SensorMeasurement
+from app.websockets.codec import (
+    BinaryCodec,
+    CodecError,
+    JsonCodec,
+    decode_frame,
+    decode_reading,
+    decode_readings,
+    encode_frame,
+    encode_reading,
+    encode_readings,
+    negotiate_codec,
+)
+
+
+def make_frame() -> SensorFrame:
+    return SensorFrame(
+        identifier="sensor-1",
+        sensor="TEM-456",
+        city="London",
+        date=datetime(2024, 10, 22, 12, 30, 15, 250),
+        info=[
+            SensorMeasurement(category="Temperature", measurement=21.5, unit="Celsius"),
+            SensorMeasurement(category="Radiation", measurement=0.12, unit="uSv/h"),
+        ],
+    )
+
+
+def test_frame_round_trip() -> None:
+    frame = make_frame()
+    data = encode_frame(frame)
+    assert decode_frame(data) == frame
+    # Known categories and units take a single byte
+    assert len(data) < len(frame.model_dump_json())
+
+
+def test_frame_with_aware_date_is_decoded_as_utc() -> None:
+    frame = make_frame()
+    frame.date = datetime(2024, 10, 22, 14, 30, tzinfo=timezone.utc)
+    assert decode_frame(encode_frame(frame)).date == datetime(2024, 10, 22, 14, 30)
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"",
+        encode_frame(make_frame())[:-3],
+        encode_frame(make_frame()) + b"\x00",
+        b"\x02" + encode_frame(make_frame())[1:],
+    ],
+)
+def test_invalid_frame(data: bytes) -> None:
+    with pytest.raises(CodecError):
+        decode_frame(data)
+
+
+def test_reading_round_trip() -> None:
+    reading = {
+        "city": "London",
+        "category": "Wind",
+        "measurement": 3.5,
+        "unit": "knots",
+        "date": "2024-10-22T12:30:15",
+    }
+    assert decode_reading(encode_reading(reading)) == {
+        **reading,
+        "date": datetime(2024, 10, 22, 12, 30, 15),
+    }
+
+
+def test_readings_batch_round_trip() -> None:
+    readings = [
+        {
+            "city": "London",
+            "category": "Humidity",
+            "measurement": float(i),
+            "unit": "Percentage",
+            "date": datetime(2024, 10, 22, 12, 0, i),
+        }
+        for i in range(3)
+    ]
+    assert decode_readings(encode_readings(readings)) == readings
+    assert decode_readings(encode_readings([])) == []
+
+
+def make_websocket(subprotocols: list[str]) -> WebSocket:
+    async def receive() -> dict[str, str]:
+        return {"type": "websocket.connect"}
+
+    async def send(_message: MutableMapping[str, Any]) -> None:
+        pass
+
+    scope = {"type": "websocket", "subprotocols": subprotocols}
+    return WebSocket(scope, receive, send)
+
+
+def test_negotiate_codec() -> None:
+    codec, subprotocol = negotiate_codec(make_websocket([]))
+    assert isinstance(codec, JsonCodec)
+    assert subprotocol is None
+
+    codec, subprotocol = negotiate_codec(
+        make_websocket(["chat", "sensor.binary.v1", "sensor.json.v1"])
+    )
+    assert isinstance(codec, BinaryCodec)
+    assert subprotocol == "sensor.binary.v1"
+
+
+@pytest.mark.parametrize(
+    "codec, message",
+    [
+        (JsonCodec(), {"type": "websocket.receive", "text": "{not json"}),
+        (JsonCodec(), {"type": "websocket.receive", "bytes": b"{}"}),
+        (BinaryCodec(), {"type": "websocket.receive", "text": "{}"}),
+    ],
+)
+def test_receive_frame_of_the_wrong_kind(codec: Any, message: dict[str, Any]) -> None:
+    messages = [{"type": "websocket.connect"}, message]
+
+    async def receive() -> dict[str, Any]:
+        return messages.pop(0)
+
+    async def send(_message: MutableMapping[str, Any]) -> None:
+        pass
+
+    async def run() -> None:
+        websocket = WebSocket({"type": "websocket"}, receive, send)
+        await websocket.accept()
+        with pytest.raises(CodecError):
+            await codec.receive_frame(websocket)
+
+    asyncio.run(run())
@@ -0,0 +1,82 @@
+import asyncio
+from collections.abc import Sequence
+from datetime import datetime
+
+import pytest
+
+from app.models import SensorDataBase
+from app.websockets.ingest import SensorDataBuffer
+
+
+def make_reading(measurement: float) -> SensorDataBase:
+    return SensorDataBase(
+        identifier="sensor-1",
+        sensor="TEM-456",
+        city="London",
+        category="Temperature",
+        measurement=measurement,
+        unit="Celsius",
+        date=datetime(2024, 10, 22, 12, 0),
+    )
+
+
+def test_buffer_flushes_in_batches() -> None:
+    batches: list[int] = []
+
+    async def writer(readings: Sequence[SensorDataBase]) -> int:
+        batches.append(len(readings))
+        return len(readings)
+
+    async def run() -> SensorDataBuffer:
+        buffer = SensorDataBuffer(
+            writer, max_size=100, batch_size=4, flush_interval=0.05
+        )
+        buffer.start()
+        await buffer.put(make_reading(i) for i in range(10))
+        await buffer.stop()
+        return buffer
+
+    buffer = asyncio.run(run())
+    assert sum(batches) == 10
+    assert max(batches) <= 4
+    assert buffer.written == 10
+    assert buffer.pending == 0
+
+
+def test_buffer_applies_backpressure() -> None:
+    async def writer(readings: Sequence[SensorDataBase]) -> int:
+        return len(readings)
+
+    async def run() -> None:
+        buffer = SensorDataBuffer(writer, max_size=2, batch_size=1, flush_interval=0)
+        buffer.start()
+        # Stop the consumer so the queue stays full and the third reading waits
+        assert buffer._task is not None
+        buffer._task.cancel()
+        put = asyncio.create_task(buffer.put(make_reading(i) for i in range(3)))
+        await asyncio.sleep(0.05)
+        assert not put.done()
+        assert buffer.pending == 2
+        put.cancel()
+
+    asyncio.run(run())
+
+
+def test_buffer_drops_batch_after_failed_retries(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr("app.websockets.ingest.retry_wait_seconds", 0)
+
+    async def writer(readings: Sequence[SensorDataBase]) -> int:  # noqa: ARG001
+        raise RuntimeError("database is down")
+
+    async def run() -> SensorDataBuffer:
+        buffer = SensorDataBuffer(writer, max_size=10, batch_size=5, flush_interval=0)
+        buffer.start()
+        await buffer.put([make_reading(1), make_reading(2)])
+        await buffer.stop()
+        return buffer
+
+    buffer = asyncio.run(run())
+    assert buffer.dropped == 2
+    assert buffer.written == 0
@@ -0,0 +1,214 @@
+import asyncio
+from collections.abc import AsyncIterator
+from typing import Any, cast
+
+import pytest
+from fastapi import WebSocket
+
+from app.websockets import manager as manager_module
+from app.websockets.broadcast import BroadcastEvent, MemoryBroadcast
+from app.websockets.manager import ConnectionManager
+
+
+def test_publish_only_reaches_topic_subscribers() -> None:
+    async def run() -> None:
+        manager = ConnectionManager(max_queue_size=10)
+        london = manager.subscribe("London")
+        athens = manager.subscribe("Athens")
+
+        assert manager.publish("London", {"measurement": 1}) == 1
+        assert manager.publish("Paris", {"measurement": 2}) == 0
+
+        assert await london.get() == {"measurement": 1}
+        assert athens.queue.empty()
+
+    asyncio.run(run())
+
+
+def test_slow_subscriber_drops_oldest_messages() -> None:
+    async def run() -> None:
+        manager = ConnectionManager(max_queue_size=2)
+        subscription = manager.subscribe("London")
+        for i in range(5):
+            manager.publish("London", i)
+
+        assert subscription.dropped == 3
+        assert [await subscription.get(), await subscription.get()] == [3, 4]
+
+    asyncio.run(run())
+
+
+def test_unsubscribe_removes_empty_topics() -> None:
+    async def run() -> None:
+        manager = ConnectionManager(max_queue_size=10)
+        subscription = manager.subscribe("London")
+        assert manager.subscriber_count == 1
+
+        manager.unsubscribe(subscription)
+        assert manager.topics == {}
+        assert manager.publish("London", {}) == 0
+
+    asyncio.run(run())
+
+
+def test_relay_delivers_broadcast_messages() -> None:
+    async def run() -> None:
+        manager = ConnectionManager(max_queue_size=10)
+        subscription = manager.subscribe("London")
+        backend = MemoryBroadcast()
+        await backend.connect()
+        relay = asyncio.create_task(manager.relay(backend))
+
+        await backend.publish("London", [{"measurement": 1}, {"measurement": 2}])
+        assert await asyncio.wait_for(subscription.get(), 1) == {"measurement": 1}
+        assert await asyncio.wait_for(subscription.get(), 1) == {"measurement": 2}
+
+        relay.cancel()
+        await backend.disconnect()
+
+    asyncio.run(run())
+
+
+def test_subscription_get_batch_coalesces_messages() -> None:
+    async def run() -> None:
+        manager = ConnectionManager(max_queue_size=10)
+        subscription = manager.subscribe("London")
+        for i in range(5):
+            manager.publish("London", i)
+
+        assert await subscription.get_batch(3, interval=0.01) == [0, 1, 2]
+        assert await subscription.get_batch(3, interval=0.01) == [3, 4]
+
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.01, manager.publish, "London", 6)
+        manager.publish("London", 5)
+        assert await subscription.get_batch(3, interval=0.5) == [5, 6]
+
+    asyncio.run(run())
+
+
+def test_recent_messages_resume_after_event_id() -> None:
+    manager = ConnectionManager(max_queue_size=10, recent_size=3, recent_topics=10)
+    for i in range(5):
+        manager.publish("London", i)
+    manager.publish("Athens", "a")
+
+    events = manager.recent.since("London", 0)
+    assert [message for _, message in events] == [2, 3, 4]
+    ids = [event_id for event_id, _ in events]
+    assert ids == sorted(set(ids))
+
+    assert [message for _, message in manager.recent.since("London", ids[0])] == [3, 4]
+    assert manager.recent.since("Paris", 0) == []
+
+
+def test_recent_messages_forget_least_recent_topic() -> None:
+    manager = ConnectionManager(max_queue_size=10, recent_size=3, recent_topics=2)
+    manager.publish("London", 1)
+    manager.publish("Athens", "a")
+    manager.publish("London", 2)
+    manager.publish("Paris", "p")
+
+    assert list(manager.recent.topics) == ["London", "Paris"]
+    assert manager.recent.since("Athens", 0) == []
+    assert [message for _, message in manager.recent.since("London", 0)] == [1, 2]
+
+
+class FailingBroadcast(MemoryBroadcast):
+    """
+    Fails the first time it is listened to.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.listened = 0
+
+    async def listen(self) -> AsyncIterator[BroadcastEvent]:
+        self.listened += 1
+        if self.listened == 1:
+            raise RuntimeError("Lost the broadcast")
+        async for event in super().listen():
+            yield event
+
+
+def test_relay_restarts_after_a_failure(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(manager_module, "relay_restart_seconds", 0)
+
+    async def run() -> None:
+        manager = ConnectionManager(max_queue_size=10)
+        subscription = manager.subscribe("London")
+        backend = FailingBroadcast()
+        await backend.connect()
+        relay = asyncio.create_task(manager.relay(backend))
+
+        await backend.publish("London", [{"measurement": 1}])
+        assert await asyncio.wait_for(subscription.get(), 1) == {"measurement": 1}
+        assert backend.listened == 2
+
+        relay.cancel()
+        await backend.disconnect()
+
+    asyncio.run(run())
+
+
+def test_failing_listener_doesnt_stop_delivery() -> None:
+    async def run() -> None:
+        manager = ConnectionManager(max_queue_size=10)
+        received: list[Any] = []
+
+        def failing(_topic: str, message: Any) -> None:
+            raise ValueError(f"Invalid date in {message}")
+
+        manager.listeners.extend([failing, lambda _, message: received.append(message)])
+        subscription = manager.subscribe("London")
+
+        assert manager.publish("London", {"date": "yesterday"}) == 1
+        assert await asyncio.wait_for(subscription.get(), 1) == {"date": "yesterday"}
+        assert received == [{"date": "yesterday"}]
+
+    asyncio.run(run())
+
+
+class RecordingWebSocket:
+    """
+    Records the JSON messages sent to it.
+    """
+
+    def __init__(self) -> None:
+        self.sent: list[Any] = []
+
+    async def accept(self, subprotocol: str | None = None) -> None:
+        pass
+
+    async def send_json(self, data: Any) -> None:
+        self.sent.append(data)
+
+
+def test_connect_sends_the_whole_snapshot() -> None:
+    async def run() -> None:
+        manager = ConnectionManager(max_queue_size=2)
+        recorder = RecordingWebSocket()
+        websocket = cast(WebSocket, recorder)
+        snapshot = [{"measurement": i} for i in range(5)]
+
+        async with manager.connect(
+            websocket,
+            "London",
+            snapshot=snapshot,
+        ) as subscription:
+            manager.publish("London", {"measurement": 5})
+            await asyncio.sleep(0)
+            assert recorder.sent == [*snapshot, {"measurement": 5}]
+            assert subscription.dropped == 0
+
+        recorder = RecordingWebSocket()
+        websocket = cast(WebSocket, recorder)
+        async with manager.connect(
+            websocket,
+            "London",
+            batch_size=2,
+            snapshot=snapshot,
+        ):
+            assert recorder.sent == [snapshot[0:2], snapshot[2:4], snapshot[4:]]
+
+    asyncio.run(run())
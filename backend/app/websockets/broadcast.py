@@ -0,0 +1,198 @@
+import asyncio
+import contextlib
+import json
+import logging
+from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator
+from typing import Any
+
+import psycopg
+from sqlalchemy import make_url
+
+from app.core.config import settings
+from app.core.db import engine
+
+logger = logging.getLogger(__name__)
+
+# A topic (city) and the messages published to it in one go
+BroadcastEvent = tuple[str, list[dict[str, Any]]]
+
+
+class BroadcastBackend(ABC):
+    """
+    Carries published sensor readings to every process serving subscribers.
+    """
+
+    @abstractmethod
+    async def connect(self) -> None: ...
+
+    @abstractmethod
+    async def disconnect(self) -> None: ...
+
+    @abstractmethod
+    async def publish(self, topic: str, messages: list[dict[str, Any]]) -> None: ...
+
+    @abstractmethod
+    def listen(self) -> AsyncIterator[BroadcastEvent]: ...
+
+
+class MemoryBroadcast(BroadcastBackend):
+    """
+    In-process backend, only reaches subscribers connected to the same worker.
+    """
+
+    def __init__(self) -> None:
+        self._queue: asyncio.Queue[BroadcastEvent] | None = None
+
+    async def connect(self) -> None:
+        self._queue = asyncio.Queue()
+
+    async def disconnect(self) -> None:
+        self._queue = None
+
+    async def publish(self, topic: str, messages: list[dict[str, Any]]) -> None:
+        if self._queue is not None:
+            self._queue.put_nowait((topic, messages))
+
+    async def listen(self) -> AsyncIterator[BroadcastEvent]:
+        assert self._queue is not None
+        while True:
+            yield await self._queue.get()
+
+
+def notify_payloads(
+    topic: str, messages: list[dict[str, Any]], max_bytes: int
+) -> list[str]:
+    """
+    JSON payloads of the messages of a topic, split so that each one fits in
+    `max_bytes`. A message too large on its own is left out.
+    """
+    batches: list[list[str]] = []
+    batch: list[str] = []
+    size = 0
+    envelope = len(json.dumps({"topic": topic, "messages": []}).encode())
+    for message in messages:
+        encoded = json.dumps(message)
+        length = len(encoded.encode()) + 2
+        if envelope + length > max_bytes:
+            logger.warning(
+                "Broadcast message too large, not delivered: %.100s", encoded
+            )
+            continue
+        if batch and envelope + size + length > max_bytes:
+            batches.append(batch)
+            batch, size = [], 0
+        batch.append(encoded)
+        size += length
+    if batch:
+        batches.append(batch)
+    return [
+        f'{{"topic": {json.dumps(topic)}, "messages": [{", ".join(batch)}]}}'
+        for batch in batches
+    ]
+
+
+class PostgresBroadcast(BroadcastBackend):
+    """
+    Backend using PostgreSQL LISTEN/NOTIFY, shared by all workers and processes
+    connected to the same database.
+
+    Publishing only queues the messages, a background task sends them, so a
+    slow database doesn't hold up the sensors. When the queue is full or the
+    database can't be reached, messages are dropped and counted: they are
+    already on their way to storage, live delivery is best effort.
+    """
+
+    channel = "sensor_data"
+    reconnect_wait_seconds = 1
+    # NOTIFY payloads must be shorter than 8000 bytes
+    max_payload_bytes = 7999
+
+    def __init__(self, conninfo: str, *, max_queue_size: int) -> None:
+        self.conninfo = conninfo
+        self.max_queue_size = max_queue_size
+        self.dropped = 0
+        self._publisher: psycopg.AsyncConnection[Any] | None = None
+        # Bound to the running loop, so created on connect
+        self._queue: asyncio.Queue[BroadcastEvent] | None = None
+        self._task: asyncio.Task[None] | None = None
+
+    async def connect(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._task = asyncio.create_task(self._send_queued(self._queue))
+
+    async def disconnect(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+        self._queue = None
+        self._task = None
+        await self._close_publisher()
+
+    async def publish(self, topic: str, messages: list[dict[str, Any]]) -> None:
+        if self._queue is None:
+            raise RuntimeError("Broadcast backend is not connected")
+        try:
+            self._queue.put_nowait((topic, messages))
+        except asyncio.QueueFull:
+            self.dropped += len(messages)
+
+    async def _close_publisher(self) -> None:
+        if self._publisher is not None:
+            await self._publisher.close()
+            self._publisher = None
+
+    async def _send_queued(self, queue: asyncio.Queue[BroadcastEvent]) -> None:
+        while True:
+            topic, messages = await queue.get()
+            try:
+                if self._publisher is None or self._publisher.closed:
+                    self._publisher = await psycopg.AsyncConnection.connect(
+                        self.conninfo, autocommit=True
+                    )
+                for payload in notify_payloads(topic, messages, self.max_payload_bytes):
+                    await self._publisher.execute(
+                        "SELECT pg_notify(%s, %s)", (self.channel, payload)
+                    )
+            except Exception:
+                self.dropped += len(messages)
+                logger.exception("Broadcasting %d messages failed", len(messages))
+                await self._close_publisher()
+                await asyncio.sleep(self.reconnect_wait_seconds)
+
+    async def listen(self) -> AsyncIterator[BroadcastEvent]:
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(
+                    self.conninfo, autocommit=True
+                ) as connection:
+                    await connection.execute(f"LISTEN {self.channel}")
+                    async for notify in connection.notifies():
+                        try:
+                            event = json.loads(notify.payload)
+                            topic, messages = event["topic"], event["messages"]
+                        except (ValueError, TypeError, KeyError):
+                            logger.warning("Invalid broadcast: %.100s", notify.payload)
+                            continue
+                        yield topic, messages
+            except psycopg.OperationalError as e:
+                logger.warning("Lost connection listening for broadcasts: %s", e)
+                await asyncio.sleep(self.reconnect_wait_seconds)
+
+
+def get_broadcast_backend() -> BroadcastBackend:
+    if settings.BROADCAST_BACKEND == "postgres":
+        url = (
+            make_url(str(settings.BROADCAST_DATABASE_URL))
+            if settings.BROADCAST_DATABASE_URL
+            else engine.url
+        )
+        conninfo = url.set(drivername="postgresql").render_as_string(
+            hide_password=False
+        )
+        return PostgresBroadcast(conninfo, max_queue_size=settings.BROADCAST_QUEUE_SIZE)
+    return MemoryBroadcast()
+
+
+broadcast = get_broadcast_backend()
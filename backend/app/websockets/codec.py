@@ -0,0 +1,284 @@
+import struct
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from fastapi import WebSocket
+
+from app.models import SensorFrame, SensorMeasurement
+
+# Dictionary codes of the known categories and units, 0 is followed by the
+# string itself. Codes are part of the wire format, only append to these.
+CATEGORIES = ("Temperature", "Humidity", "Wind", "Pressure", "Precipitation")
+UNITS = ("Celsius", "Percentage", "m/s", "hPa", "mm")
+
+EPOCH = datetime(1970, 1, 1)
+
+# version, date (microseconds since the epoch, UTC), number of measurements
+_frame_header = struct.Struct("!BqB")
+# measurement, category code, unit code
+_measurement = struct.Struct("!dBB")
+# date, measurement, category code, unit code
+_reading = struct.Struct("!qdBB")
+_length = struct.Struct("!B")
+# number of readings in a batch
+_batch_header = struct.Struct("!H")
+
+BINARY_VERSION = 1
+
+
+class CodecError(ValueError):
+    pass
+
+
+class SensorCodec(ABC):
+    """
+    Wire encoding of the frames received from sensors and of the readings sent
+    to subscribers, negotiated as a WebSocket subprotocol.
+    """
+
+    subprotocol: str
+
+    @abstractmethod
+    async def receive_frame(self, websocket: WebSocket) -> SensorFrame:
+        """
+        Receive and decode a frame, raises CodecError or ValidationError.
+        """
+
+    @abstractmethod
+    async def send_reading(self, websocket: WebSocket, reading: dict[str, Any]) -> None:
+        """
+        Send a published reading (city, category, measurement, unit, date).
+        """
+
+    @abstractmethod
+    async def send_readings(
+        self, websocket: WebSocket, readings: list[dict[str, Any]]
+    ) -> None:
+        """
+        Send several readings in a single message.
+        """
+
+
+class JsonCodec(SensorCodec):
+    subprotocol = "sensor.json.v1"
+
+    async def receive_frame(self, websocket: WebSocket) -> SensorFrame:
+        try:
+            data = await websocket.receive_json()
+        except (KeyError, TypeError, ValueError) as e:
+            # Binary message, without text, or invalid JSON
+            raise CodecError("Expected a JSON text message") from e
+        return SensorFrame.model_validate(data)
+
+    async def send_reading(self, websocket: WebSocket, reading: dict[str, Any]) -> None:
+        await websocket.send_json(reading)
+
+    async def send_readings(
+        self, websocket: WebSocket, readings: list[dict[str, Any]]
+    ) -> None:
+        await websocket.send_json(readings)
+
+
+class BinaryCodec(SensorCodec):
+    """
+    Fixed binary layout in network byte order, strings are prefixed by their
+    length in bytes (at most 255).
+
+    Frame: version (u8), date (i64 microseconds since the epoch, UTC), number of
+    measurements (u8), identifier, sensor and city strings, then per
+    measurement: value (f64), category code (u8), unit code (u8), followed by
+    the category and unit strings when their code is 0.
+
+    Reading: date (i64), value (f64), category code (u8), unit code (u8), the
+    category and unit strings when their code is 0, then the city string.
+
+    Batch of readings: number of readings (u16), then the readings.
+    """
+
+    subprotocol = "sensor.binary.v1"
+
+    async def receive_frame(self, websocket: WebSocket) -> SensorFrame:
+        try:
+            data = await websocket.receive_bytes()
+        except KeyError as e:
+            raise CodecError("Expected a binary message") from e
+        if not isinstance(data, bytes):
+            raise CodecError("Expected a binary message")
+        return decode_frame(data)
+
+    async def send_reading(self, websocket: WebSocket, reading: dict[str, Any]) -> None:
+        await websocket.send_bytes(encode_reading(reading))
+
+    async def send_readings(
+        self, websocket: WebSocket, readings: list[dict[str, Any]]
+    ) -> None:
+        await websocket.send_bytes(encode_readings(readings))
+
+
+def _to_microseconds(date: datetime) -> int:
+    if date.tzinfo is not None:
+        date = date.astimezone(timezone.utc).replace(tzinfo=None)
+    return (date - EPOCH) // timedelta(microseconds=1)
+
+
+def _pack_string(value: str) -> bytes:
+    data = value.encode()
+    if len(data) > 255:
+        raise CodecError(f"String longer than 255 bytes: {value[:20]}...")
+    return _length.pack(len(data)) + data
+
+
+def _unpack_string(data: bytes, offset: int) -> tuple[str, int]:
+    (length,) = _length.unpack_from(data, offset)
+    offset += _length.size
+    if offset + length > len(data):
+        raise CodecError("Truncated string")
+    return data[offset : offset + length].decode(), offset + length
+
+
+def _code(table: tuple[str, ...], value: str) -> int:
+    try:
+        return table.index(value) + 1
+    except ValueError:
+        return 0
+
+
+def _lookup(
+    table: tuple[str, ...], code: int, data: bytes, offset: int
+) -> tuple[str, int]:
+    if code == 0:
+        return _unpack_string(data, offset)
+    if code > len(table):
+        raise CodecError(f"Unknown dictionary code {code}")
+    return table[code - 1], offset
+
+
+def encode_frame(frame: SensorFrame) -> bytes:
+    if len(frame.info) > 255:
+        raise CodecError("More than 255 measurements in a frame")
+    parts = [
+        _frame_header.pack(
+            BINARY_VERSION, _to_microseconds(frame.date), len(frame.info)
+        ),
+        _pack_string(frame.identifier),
+        _pack_string(frame.sensor),
+        _pack_string(frame.city),
+    ]
+    for info in frame.info:
+        category = _code(CATEGORIES, info.category)
+        unit = _code(UNITS, info.unit)
+        parts.append(_measurement.pack(info.measurement, category, unit))
+        if not category:
+            parts.append(_pack_string(info.category))
+        if not unit:
+            parts.append(_pack_string(info.unit))
+    return b"".join(parts)
+
+
+def decode_frame(data: bytes) -> SensorFrame:
+    try:
+        version, microseconds, count = _frame_header.unpack_from(data)
+        if version != BINARY_VERSION:
+            raise CodecError(f"Unsupported frame version {version}")
+        offset = _frame_header.size
+        identifier, offset = _unpack_string(data, offset)
+        sensor, offset = _unpack_string(data, offset)
+        city, offset = _unpack_string(data, offset)
+        info = []
+        for _ in range(count):
+            measurement, category_code, unit_code = _measurement.unpack_from(
+                data, offset
+            )
+            offset += _measurement.size
+            category, offset = _lookup(CATEGORIES, category_code, data, offset)
+            unit, offset = _lookup(UNITS, unit_code, data, offset)
+            info.append(
+                SensorMeasurement(category=category, measurement=measurement, unit=unit)
+            )
+    except (struct.error, UnicodeDecodeError, OverflowError) as e:
+        raise CodecError(str(e)) from e
+    if offset != len(data):
+        raise CodecError("Unexpected data after the frame")
+    return SensorFrame(
+        identifier=identifier,
+        sensor=sensor,
+        city=city,
+        date=EPOCH + timedelta(microseconds=microseconds),
+        info=info,
+    )
+
+
+def encode_reading(reading: dict[str, Any]) -> bytes:
+    date = reading["date"]
+    if isinstance(date, str):
+        date = datetime.fromisoformat(date)
+    category = _code(CATEGORIES, reading["category"])
+    unit = _code(UNITS, reading["unit"])
+    parts = [
+        _reading.pack(_to_microseconds(date), reading["measurement"], category, unit)
+    ]
+    if not category:
+        parts.append(_pack_string(reading["category"]))
+    if not unit:
+        parts.append(_pack_string(reading["unit"]))
+    parts.append(_pack_string(reading["city"]))
+    return b"".join(parts)
+
+
+def encode_readings(readings: list[dict[str, Any]]) -> bytes:
+    if len(readings) > 65535:
+        raise CodecError("More than 65535 readings in a batch")
+    return _batch_header.pack(len(readings)) + b"".join(
+        encode_reading(reading) for reading in readings
+    )
+
+
+def _decode_reading(data: bytes, offset: int) -> tuple[dict[str, Any], int]:
+    microseconds, measurement, category_code, unit_code = _reading.unpack_from(
+        data, offset
+    )
+    offset += _reading.size
+    category, offset = _lookup(CATEGORIES, category_code, data, offset)
+    unit, offset = _lookup(UNITS, unit_code, data, offset)
+    city, offset = _unpack_string(data, offset)
+    reading = {
+        "city": city,
+        "category": category,
+        "measurement": measurement,
+        "unit": unit,
+        "date": EPOCH + timedelta(microseconds=microseconds),
+    }
+    return reading, offset
+
+
+def decode_reading(data: bytes) -> dict[str, Any]:
+    return _decode_reading(data, 0)[0]
+
+
+def decode_readings(data: bytes) -> list[dict[str, Any]]:
+    (count,) = _batch_header.unpack_from(data)
+    offset = _batch_header.size
+    readings = []
+    for _ in range(count):
+        reading, offset = _decode_reading(data, offset)
+        readings.append(reading)
+    return readings
+
+
+json_codec = JsonCodec()
+codecs: dict[str, SensorCodec] = {
+    codec.subprotocol: codec for codec in (json_codec, BinaryCodec())
+}
+
+
+def negotiate_codec(websocket: WebSocket) -> tuple[SensorCodec, str | None]:
+    """
+    First codec of the subprotocols offered by the client, JSON by default.
+
+    Returns the codec and the subprotocol to accept, None if none was offered.
+    """
+    for subprotocol in websocket.scope.get("subprotocols", []):
+        if subprotocol in codecs:
+            return codecs[subprotocol], subprotocol
+    return json_codec, None
@@ -0,0 +1,137 @@
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable, Iterable, Sequence
+from typing import cast
+
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import crud
+from app.core.config import settings
+from app.core.db import async_engine, session_options
+from app.models import SensorDataBase
+
+logger = logging.getLogger(__name__)
+
+max_write_tries = 3
+retry_wait_seconds = 1
+
+
+async def save_sensor_data(readings: Sequence[SensorDataBase]) -> int:
+    async with AsyncSession(async_engine, **session_options("ingest")) as session:
+        return await session.run_sync(
+            lambda sync_session: crud.create_sensor_data(
+                session=cast(Session, sync_session), readings=readings
+            )
+        )
+
+
+class SensorDataBuffer:
+    """
+    Write-behind buffer between the WebSocket receive loops and the database.
+
+    Readings are accepted into a bounded queue and written by a background task
+    in batches of up to `batch_size` readings, or whatever arrived within
+    `flush_interval` seconds of the first one. When the database falls behind
+    and the queue is full, `put` waits, which slows down the producers instead
+    of growing memory without limit.
+    """
+
+    def __init__(
+        self,
+        writer: Callable[[Sequence[SensorDataBase]], Awaitable[int]],
+        *,
+        max_size: int,
+        batch_size: int,
+        flush_interval: float,
+    ) -> None:
+        self.writer = writer
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        # The queue is bound to the running loop, so it is created on start
+        self._queue: asyncio.Queue[SensorDataBase] | None = None
+        self._task: asyncio.Task[None] | None = None
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._queue is None or self._task is None:
+            return
+        # Flush what is already buffered before shutting down
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._queue = None
+        self._task = None
+
+    async def put(self, readings: Iterable[SensorDataBase]) -> None:
+        if self._queue is None:
+            raise RuntimeError("Sensor data buffer is not started")
+        for reading in readings:
+            await self._queue.put(reading)
+
+    async def _next_batch(
+        self, queue: asyncio.Queue[SensorDataBase]
+    ) -> list[SensorDataBase]:
+        batch = [await queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            if not queue.empty():
+                batch.append(queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _flush(self, batch: list[SensorDataBase]) -> None:
+        for attempt in range(1, max_write_tries + 1):
+            try:
+                self.written += await self.writer(batch)
+                return
+            except Exception:
+                logger.exception(
+                    "Writing %d sensor readings failed (attempt %d/%d)",
+                    len(batch),
+                    attempt,
+                    max_write_tries,
+                )
+                if attempt < max_write_tries:
+                    await asyncio.sleep(retry_wait_seconds)
+        self.dropped += len(batch)
+
+    async def _run(self) -> None:
+        assert self._queue is not None
+        queue = self._queue
+        while True:
+            batch = await self._next_batch(queue)
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+
+sensor_data_buffer = SensorDataBuffer(
+    save_sensor_data,
+    max_size=settings.SENSOR_INGEST_QUEUE_SIZE,
+    batch_size=settings.SENSOR_INGEST_BATCH_SIZE,
+    flush_interval=settings.SENSOR_INGEST_FLUSH_SECONDS,
+)
@@ -0,0 +1,254 @@
+import asyncio
+import contextlib
+import logging
+import time
+from collections import OrderedDict, deque
+from collections.abc import AsyncGenerator, Callable
+from typing import Any
+
+from fastapi import WebSocket
+
+from app.core.config import settings
+from app.websockets.broadcast import BroadcastBackend
+from app.websockets.codec import SensorCodec, json_codec
+
+logger = logging.getLogger(__name__)
+
+relay_restart_seconds = 1
+
+
+class Subscription:
+    """
+    Bounded queue of messages for one subscriber of a topic.
+
+    When the subscriber can't keep up and the queue is full, the oldest message
+    is dropped so that publishing never waits on a slow consumer.
+    """
+
+    def __init__(self, topic: str, max_size: int) -> None:
+        self.topic = topic
+        # Messages with their event id
+        self.queue: asyncio.Queue[tuple[int, Any]] = asyncio.Queue(maxsize=max_size)
+        self.dropped = 0
+
+    def push(self, message: Any, event_id: int = 0) -> None:
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait((event_id, message))
+
+    async def get(self) -> Any:
+        return (await self.queue.get())[1]
+
+    async def get_event(self) -> tuple[int, Any]:
+        return await self.queue.get()
+
+    async def get_batch(self, max_size: int, interval: float) -> list[Any]:
+        """
+        Wait for a message, then collect up to `max_size` of them arriving
+        within `interval` seconds of it.
+        """
+        batch = [await self.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + interval
+        while len(batch) < max_size:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait()[1])
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+
+class RecentMessages:
+    """
+    Ring buffer of the last `max_size` messages published on each topic, to
+    resume streams after a reconnect without querying the database.
+
+    Event ids are nanosecond timestamps taken when the message is published in
+    this process, strictly increasing. Ids of different workers are close in
+    time, so resuming on another worker only misses or repeats messages
+    published around the same instant.
+
+    Topics come from the published messages, beyond `max_topics` the least
+    recently published one is forgotten.
+    """
+
+    def __init__(self, max_size: int, max_topics: int) -> None:
+        self.max_size = max_size
+        self.max_topics = max_topics
+        self.topics: OrderedDict[str, deque[tuple[int, Any]]] = OrderedDict()
+        self._last_id = 0
+
+    def add(self, topic: str, message: Any) -> int:
+        event_id = max(time.time_ns(), self._last_id + 1)
+        self._last_id = event_id
+        messages = self.topics.get(topic)
+        if messages is None:
+            messages = self.topics[topic] = deque(maxlen=self.max_size)
+            while len(self.topics) > self.max_topics:
+                self.topics.popitem(last=False)
+        else:
+            self.topics.move_to_end(topic)
+        messages.append((event_id, message))
+        return event_id
+
+    def since(self, topic: str, last_id: int) -> list[tuple[int, Any]]:
+        return [
+            (event_id, message)
+            for event_id, message in self.topics.get(topic, ())
+            if event_id > last_id
+        ]
+
+
+class ConnectionManager:
+    """
+    Registry of subscriptions keyed by topic (the city of the sensor data).
+
+    Publishing only touches the subscribers of the given topic and never awaits
+    them, each connection is served by its own sender task.
+    """
+
+    def __init__(
+        self, max_queue_size: int, recent_size: int = 0, recent_topics: int = 0
+    ) -> None:
+        self.max_queue_size = max_queue_size
+        self.topics: dict[str, set[Subscription]] = {}
+        self.recent = RecentMessages(recent_size, recent_topics)
+        # Called with the topic and message of everything published
+        self.listeners: list[Callable[[str, Any], None]] = []
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(subscriptions) for subscriptions in self.topics.values())
+
+    def subscribe(self, topic: str) -> Subscription:
+        subscription = Subscription(topic, self.max_queue_size)
+        self.topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self.topics.get(subscription.topic)
+        if subscriptions is None:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self.topics[subscription.topic]
+
+    def publish(self, topic: str, message: Any) -> int:
+        event_id = self.recent.add(topic, message) if self.recent.max_size else 0
+        subscriptions = self.topics.get(topic, ())
+        for subscription in subscriptions:
+            subscription.push(message, event_id)
+        # A failing listener must not hold up delivery or the other listeners
+        for listener in self.listeners:
+            try:
+                listener(topic, message)
+            except Exception:
+                logger.exception("Listener of %s failed on %.100r", topic, message)
+        return len(subscriptions)
+
+    async def relay(self, backend: BroadcastBackend) -> None:
+        """
+        Deliver everything published on the broadcast backend to local subscribers.
+
+        Runs until cancelled, a message that fails is skipped and a failing
+        backend is listened to again.
+        """
+        while True:
+            try:
+                async for topic, messages in backend.listen():
+                    for message in messages:
+                        try:
+                            self.publish(topic, message)
+                        except Exception:
+                            logger.exception("Relaying a message to %s failed", topic)
+            except Exception:
+                logger.exception("Listening for broadcasts failed, restarting")
+            await asyncio.sleep(relay_restart_seconds)
+
+    async def _send(
+        self,
+        websocket: WebSocket,
+        subscription: Subscription,
+        codec: SensorCodec,
+        batch_size: int,
+        batch_interval: float,
+    ) -> None:
+        try:
+            while True:
+                if batch_size <= 1:
+                    await codec.send_reading(websocket, await subscription.get())
+                    continue
+                batch = await subscription.get_batch(batch_size, batch_interval)
+                await codec.send_readings(websocket, batch)
+        except Exception as e:
+            # The receive loop notices the closed connection and cleans up
+            logger.info(
+                "Stopped sending to subscriber of %s: %s", subscription.topic, e
+            )
+
+    @contextlib.asynccontextmanager
+    async def connect(
+        self,
+        websocket: WebSocket,
+        topic: str,
+        codec: SensorCodec = json_codec,
+        subprotocol: str | None = None,
+        batch_size: int = 1,
+        batch_interval: float = 0,
+        snapshot: list[Any] | None = None,
+    ) -> AsyncGenerator[Subscription, None]:
+        """
+        Accept the connection and send it the messages published on the topic
+        while the context is open, after the snapshot messages if given.
+
+        With a batch_size above 1, messages arriving within batch_interval
+        seconds are coalesced into one WebSocket message (a list), and the
+        snapshot is sent in lists of batch_size messages.
+        """
+        await websocket.accept(subprotocol=subprotocol)
+        subscription = self.subscribe(topic)
+        try:
+            # Sent directly, the subscription queue would drop the oldest
+            # messages of a snapshot larger than itself. Messages published
+            # meanwhile wait in the queue.
+            try:
+                await self._send_snapshot(websocket, codec, snapshot or [], batch_size)
+            except Exception as e:
+                logger.info("Failed to send the snapshot of %s: %s", topic, e)
+            sender = asyncio.create_task(
+                self._send(websocket, subscription, codec, batch_size, batch_interval)
+            )
+            try:
+                yield subscription
+            finally:
+                sender.cancel()
+        finally:
+            self.unsubscribe(subscription)
+
+    async def _send_snapshot(
+        self,
+        websocket: WebSocket,
+        codec: SensorCodec,
+        snapshot: list[Any],
+        batch_size: int,
+    ) -> None:
+        if batch_size <= 1:
+            for message in snapshot:
+                await codec.send_reading(websocket, message)
+            return
+        for start in range(0, len(snapshot), batch_size):
+            await codec.send_readings(websocket, snapshot[start : start + batch_size])
+
+
+manager = ConnectionManager(
+    max_queue_size=settings.SENSOR_SUBSCRIBER_QUEUE_SIZE,
+    recent_size=settings.SENSOR_STREAM_BUFFER_SIZE,
+    recent_topics=settings.SENSOR_LIVE_MAX_CITIES,
+)
@@ -0,0 +1,42 @@
+import argparse
+import logging
+import sys
+
+from app.sensors.bulk import SensorDataBulkLoader, iter_chunks
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Bulk load buffered sensor readings into the database with COPY."
+    )
+    parser.add_argument("path", help="NDJSON or CSV file, '-' for stdin")
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    loader = SensorDataBulkLoader(args.format)
+    with sys.stdin if args.path == "-" else open(args.path, newline="") as file:
+        for chunk in iter_chunks(file, args.chunk_size):
+            loader.load_chunk(chunk)
+            logger.info(
+                "Loaded %d rows (%d rejected)",
+                loader.report.rows_loaded,
+                loader.report.rows_rejected,
+            )
+    report = loader.finish()
+    logger.info(
+        "Loaded %d rows in %.2fs (%.0f rows/s), rejected %d chunks",
+        report.rows_loaded,
+        report.seconds,
+        report.rows_per_second,
+        report.chunks_rejected,
+    )
+    for error in report.errors:
+        logger.warning(error)
+
+
+if __name__ == "__main__":
+    main()
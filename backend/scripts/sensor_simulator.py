@@ -3,42 +3,104 @@ import random
 import uuid
 from datetime import datetime
 
-from sqlmodel import Session
+from sqlmodel import Session, select
 
-from app.api.routes.websockets import broadcast_new_data
+from app import crud
 from app.core.db import engine
-from app.models import SensorData
+from app.models import MeteorologicalStation, SensorDataBase
+from app.websockets.broadcast import PostgresBroadcast, get_broadcast_backend
 
+interval_seconds = 1
+station_name = "London"
 
-def generate_mock_data():
-    sensors = [
-        {"sensor": "HUM-001", "category": "Humidity", "unit": "Percentage"},
-        {"sensor": "TEM-456", "category": "Temperature", "unit": "Celsius"},
-        {"sensor": "WND-245", "category": "Wind", "unit": "m/s"},
-    ]
-    city = "London"
+# Identifiers are kept for the whole run, every sensor is registered once
+sensors = [
+    {
+        "identifier": str(uuid.uuid4()),
+        "sensor": "HUM-001",
+        "category": "Humidity",
+        "unit": "Percentage",
+    },
+    {
+        "identifier": str(uuid.uuid4()),
+        "sensor": "TEM-456",
+        "category": "Temperature",
+        "unit": "Celsius",
+    },
+    {
+        "identifier": str(uuid.uuid4()),
+        "sensor": "WND-245",
+        "category": "Wind",
+        "unit": "m/s",
+    },
+]
 
+
+def get_station_code() -> str:
+    """
+    Code of the simulated station, created if no station has its name yet.
+    """
+    with Session(engine) as session:
+        station = session.exec(
+            select(MeteorologicalStation).where(
+                MeteorologicalStation.name == station_name
+            )
+        ).first()
+        if station is None:
+            station = MeteorologicalStation(
+                name=station_name,
+                latitude=51.5074,
+                longitude=-0.1278,
+                date_of_installation=datetime.utcnow(),
+            )
+            session.add(station)
+            session.commit()
+            session.refresh(station)
+        return str(station.code)
+
+
+def generate_mock_data(city: str):
     for sensor_info in sensors:
         yield {
-            "identifier": str(uuid.uuid4()),
-            "sensor": sensor_info["sensor"],
+            **sensor_info,
             "city": city,
-            "category": sensor_info["category"],
             "measurement": random.uniform(10, 100),
-            "unit": sensor_info["unit"],
             "date": datetime.utcnow(),
         }
 
 
-def save_data_to_db():
+def save_data_to_db(city: str) -> list[SensorDataBase]:
+    readings = [SensorDataBase(**data) for data in generate_mock_data(city)]
     with Session(engine) as session:
-        for data in generate_mock_data():
-            sensor_data = SensorData(**data)
-            session.add(sensor_data)
-            session.commit()
-            asyncio.run(broadcast_new_data(sensor_data))
+        crud.create_sensor_data(session=session, readings=readings)
+    return readings
+
+
+async def main() -> None:
+    broadcast = get_broadcast_backend()
+    if not isinstance(broadcast, PostgresBroadcast):
+        raise SystemExit(
+            'The simulator runs in its own process, set BROADCAST_BACKEND="postgres"'
+        )
+    city = get_station_code()
+    await broadcast.connect()
+    try:
+        while True:
+            readings = save_data_to_db(city)
+            await broadcast.publish(
+                readings[0].city,
+                [
+                    reading.model_dump(
+                        mode="json",
+                        include={"city", "category", "measurement", "unit", "date"},
+                    )
+                    for reading in readings
+                ],
+            )
+            await asyncio.sleep(interval_seconds)
+    finally:
+        await broadcast.disconnect()
 
 
 if __name__ == "__main__":
-    while True:
-        save_data_to_db()
+    asyncio.run(main())